@@ -4,6 +4,7 @@ from django.db import models
 from base.permissions import DependencyPermission
 from ..serializers import SmartDependencySerializer 
 from ..models import TaskDependency
+from ..services.dependency_graph import creates_circular_dependency
 from rest_framework.decorators import action
 import uuid
 from rest_framework.response import Response
@@ -107,27 +108,7 @@ class TaskDependencyViewSet(viewsets.ModelViewSet):
     
     def _creates_circular_dependency(self, task, depends_on):
         """Check if the new dependency would create a loop"""
-        if depends_on.id == task.id:
-            return True
-            
-        visited = set()
-        queue = [depends_on]
-        
-        while queue:
-            current = queue.pop()
-            if current.id == task.id:
-                return True
-            if current.id in visited:
-                continue
-            visited.add(current.id)
-            
-            dependencies = TaskDependency.objects.filter(
-                task=current
-            ).select_related('depends_on')
-            
-            queue.extend([dep.depends_on for dep in dependencies])
-        
-        return False
+        return creates_circular_dependency(task, depends_on)
 
     def destroy(self, request, *args, **kwargs):
         """
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from base.services.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recomputes task descendant counters and project task counters from scratch'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            tasks, projects = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt counters for {tasks} tasks and {projects} projects'
+        ))
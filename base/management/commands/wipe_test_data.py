@@ -21,7 +21,7 @@ class Command(BaseCommand):
                 cursor.execute("DELETE FROM sqlite_sequence")
                 self.stdout.write("Reset SQLite auto-increment counters")
             elif vendor in ['postgresql', 'mysql']:
-                tables = ['auth_user', 'base_project', 'base_task']
+                tables = ['auth_user', 'base_project', 'base_task', 'base_taskclosure', 'base_scheduleentry']
                 for table in tables:
                     cursor.execute(
                         f"ALTER SEQUENCE {table}_id_seq RESTART WITH 1"
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_closure(apps, schema_editor):
+    Task = apps.get_model("base", "Task")
+    TaskClosure = apps.get_model("base", "TaskClosure")
+
+    parents = dict(Task.objects.values_list("id", "parent_task_id"))
+    rows = []
+    for task_id in parents:
+        depth = 0
+        current = task_id
+        while current is not None:
+            rows.append(
+                TaskClosure(ancestor_id=current, descendant_id=task_id, depth=depth)
+            )
+            current = parents.get(current)
+            depth += 1
+    TaskClosure.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0011_alter_taskdependency_logic"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveIntegerField()),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="base.task",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="base.task",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["descendant", "depth"],
+                        name="taskclosure_desc_depth_idx",
+                    )
+                ],
+                "unique_together": {("ancestor", "descendant")},
+            },
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:20
+
+import time
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    ScheduleVersion = apps.get_model("base", "ScheduleVersion")
+
+    # Seeded from the clock, like the row schedule_cache recreates if it is missing
+    ScheduleVersion.objects.create(pk=1, data_version=int(time.time() * 1000))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0012_taskclosure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduleVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data_version", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0013_scheduleversion"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduleEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_date", models.DateField()),
+                ("end_date", models.DateField()),
+                ("version", models.BigIntegerField()),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="schedule_entries",
+                        to="base.project",
+                    ),
+                ),
+                (
+                    "task",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="schedule_entry",
+                        to="base.task",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Schedule entries",
+                "indexes": [
+                    models.Index(
+                        fields=["start_date", "end_date"], name="schedentry_window_idx"
+                    ),
+                    models.Index(
+                        fields=["user", "start_date"], name="schedentry_user_start_idx"
+                    ),
+                    models.Index(
+                        fields=["project", "start_date"],
+                        name="schedentry_project_start_idx",
+                    ),
+                    models.Index(fields=["version"], name="schedentry_version_idx"),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name="scheduleversion",
+            name="stored_version",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
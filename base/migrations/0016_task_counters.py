@@ -0,0 +1,80 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Project = apps.get_model("base", "Project")
+    Task = apps.get_model("base", "Task")
+    TaskClosure = apps.get_model("base", "TaskClosure")
+
+    def count(queryset, group_by):
+        return Coalesce(
+            Subquery(
+                queryset.values(group_by).annotate(total=Count("pk")).values("total")
+            ),
+            Value(0),
+        )
+
+    below = TaskClosure.objects.filter(
+        ancestor_id=OuterRef("pk"), depth__gt=0
+    ).order_by()
+    Task.objects.update(
+        descendant_count=count(below, "ancestor_id"),
+        completed_descendant_count=count(
+            below.filter(descendant__completed=True), "ancestor_id"
+        ),
+    )
+
+    owned = Task.objects.filter(project_id=OuterRef("pk")).order_by()
+    Project.objects.update(
+        task_count=count(owned, "project_id"),
+        completed_task_count=count(owned.filter(completed=True), "project_id"),
+        private_task_count=count(owned.filter(is_private=True), "project_id"),
+        completed_private_task_count=count(
+            owned.filter(is_private=True, completed=True), "project_id"
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0015_schedulejob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="completed_private_task_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="completed_task_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="private_task_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="task_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="completed_descendant_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="descendant_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-17 07:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0016_task_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="project_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["parent_task", "-created_at", "-id"],
+                name="task_root_keyset_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-17 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("base", "0017_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="schedulejob",
+            name="worker",
+            field=models.CharField(
+                blank=True,
+                help_text="host:pid of the process whose pool runs the job",
+                max_length=255,
+            ),
+        ),
+    ]
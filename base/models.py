@@ -1,10 +1,28 @@
 from collections import defaultdict
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+from .services.counters import (
+    PROJECT_COUNTERS,
+    TASK_COUNTERS,
+    record_task_changes,
+    shift_subtree_counters,
+    task_state,
+)
+from .services.rollup import rollup_completion
+
+def _fields_except(instance, excluded):
+    """Names of the instance's saveable fields, minus excluded"""
+    return [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in excluded
+    ]
+
+
 class Project(models.Model):
     """Represents a project containing tasks, owned by a user with timeline attributes."""
     owner = models.ForeignKey(
@@ -23,9 +41,27 @@ class Project(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Maintained by services.counters alongside task writes; see rebuild_task_counters
+    task_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_task_count = models.PositiveIntegerField(default=0, editable=False)
+    private_task_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_private_task_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination order (see base.pagination)
+            models.Index(fields=['-created_at', '-id'], name='project_keyset_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Counters are written with in-place UPDATEs; never overwrite them from memory
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = _fields_except(self, PROJECT_COUNTERS)
+        super().save(*args, **kwargs)
+
    
 
 class Task(models.Model):
@@ -68,6 +104,10 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    # Subtasks at any depth; maintained by services.counters
+    descendant_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_descendant_count = models.PositiveIntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ['-created_at']
         constraints = [
@@ -76,6 +116,10 @@ class Task(models.Model):
                 name='has_project_or_parent'
             )
         ]
+        indexes = [
+            # Keyset pagination of root tasks (see base.pagination)
+            models.Index(fields=['parent_task', '-created_at', '-id'], name='task_root_keyset_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         
@@ -87,28 +131,86 @@ class Task(models.Model):
             self.completed_at = timezone.now()
         elif not self.completed and self.completed_at:
             self.completed_at = None
-            
-        super().save(*args, **kwargs)
-        
-        
-        if self.parent_task:
-            self.parent_task.update_completion_status()
+
+        adding = self._state.adding
+        if not adding and kwargs.get('update_fields') is None:
+            # Counters are written with in-place UPDATEs; never overwrite them from memory
+            kwargs['update_fields'] = _fields_except(self, TASK_COUNTERS)
+        written = self._written_fields(kwargs.get('update_fields'))
+
+        # Closure rows, counters and the parent rollup commit together
+        with transaction.atomic():
+            # What is stored now, not what this instance loaded: another
+            # instance may have changed the row since
+            stored = None if adding else self._lock_stored_row()
+            before = None if stored is None else (
+                stored['project_id'], stored['is_private'], stored['completed']
+            )
+            moved = (
+                stored is not None and 'parent_task' in written and
+                stored['parent_task_id'] != self.parent_task_id
+            )
+            if stored is not None:
+                # Read by the post_save receivers
+                self._loaded_project_id = stored['project_id']
+                self._loaded_duration_days = stored['duration_days']
+
+            if moved:
+                shift_subtree_counters(self.pk, -1)
+            super().save(*args, **kwargs)
+            if adding:
+                TaskClosure.link_new_task(self)
+            elif moved:
+                TaskClosure.move_subtree(self)
+                shift_subtree_counters(self.pk, 1)
+            after = task_state(self)
+            if stored is not None:
+                # Fields left out of update_fields keep their stored values
+                after = tuple(
+                    value if field in written else stored[attname]
+                    for value, field, attname in zip(
+                        after, ('project', 'is_private', 'completed'),
+                        ('project_id', 'is_private', 'completed')
+                    )
+                )
+            if before != after:
+                record_task_changes([(self.pk, before, after)], ancestors=not moved)
+
+            if self.parent_task_id:
+                completed_ids, reopened_ids = rollup_completion([self.parent_task_id])
+                if Task.parent_task.is_cached(self):
+                    self.parent_task._apply_rollup(completed_ids, reopened_ids)
+
+    def _written_fields(self, update_fields):
+        """Names of the fields a save() with these update_fields writes"""
+        if update_fields is None:
+            return {field.name for field in self._meta.concrete_fields}
+        return {self._meta.get_field(name).name for name in update_fields}
+
+    def _lock_stored_row(self):
+        """The stored values save() compares against, locked until the transaction ends"""
+        return Task.objects.select_for_update().filter(pk=self.pk).values(
+            'parent_task_id', 'project_id', 'is_private', 'completed', 'duration_days'
+        ).first()
 
     def update_completion_status(self):
         """
         Update completion status based on subtasks.
         If all subtasks are complete, mark parent as complete.
         If any subtask is incomplete, mark parent as incomplete.
+        Changes roll up the ancestor chain in bulk (see services.rollup).
         """
-        if self.subtasks.exists():
-            all_complete = not self.subtasks.filter(completed=False).exists()
-            if self.completed != all_complete:
-                self.completed = all_complete
-                if self.completed:
-                    self.completed_at = timezone.now()
-                else:
-                    self.completed_at = None
-                self.save(update_fields=['completed', 'completed_at'])
+        completed_ids, reopened_ids = rollup_completion([self.id])
+        self._apply_rollup(completed_ids, reopened_ids)
+
+    def _apply_rollup(self, completed_ids, reopened_ids):
+        """Mirror a rollup result onto this in-memory instance"""
+        if self.id in completed_ids:
+            self.completed = True
+            self.completed_at = timezone.now()
+        elif self.id in reopened_ids:
+            self.completed = False
+            self.completed_at = None
     
     def mark_complete(self):
         """Mark task as complete and handle project switching"""
@@ -169,12 +271,86 @@ class Task(models.Model):
     def __str__(self):
         return f"{self.title} ({self.project.title if self.project else 'No Project'})"
     
+    def get_descendants(self):
+        """Queryset of every task below this one, at any depth"""
+        return Task.objects.filter(
+            ancestor_links__ancestor=self,
+            ancestor_links__depth__gt=0
+        )
+
+    def get_ancestors(self):
+        """Queryset of the parent chain, nearest parent first"""
+        return Task.objects.filter(
+            descendant_links__descendant=self,
+            descendant_links__depth__gt=0
+        ).order_by('descendant_links__depth')
+
     def get_all_subtasks(self):
-        """Recursively get all subtasks"""
-        subtasks = list(self.subtasks.all())
-        for child in self.subtasks.all():
-            subtasks.extend(child.get_all_subtasks())
-        return subtasks
+        """Get all subtasks in one query, shallowest levels first"""
+        return list(self.get_descendants().order_by('ancestor_links__depth', '-created_at'))
+
+
+class TaskClosure(models.Model):
+    """
+    Closure table for the task hierarchy.
+    Stores one row per (ancestor, descendant) pair, including each task
+    paired with itself at depth 0, so subtrees and ancestor chains load
+    in a single indexed query.
+    """
+    ancestor = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='taskclosure_desc_depth_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+    @classmethod
+    def link_new_task(cls, task):
+        """Add closure rows for a freshly created task"""
+        rows = [cls(ancestor_id=task.id, descendant_id=task.id, depth=0)]
+        if task.parent_task_id:
+            rows.extend(
+                cls(ancestor_id=ancestor_id, descendant_id=task.id, depth=depth + 1)
+                for ancestor_id, depth in cls.objects.filter(
+                    descendant_id=task.parent_task_id
+                ).values_list('ancestor_id', 'depth')
+            )
+        cls.objects.bulk_create(rows)
+
+    @classmethod
+    def move_subtree(cls, task):
+        """Re-link the subtree rooted at task under its new parent"""
+        subtree = list(cls.objects.filter(ancestor_id=task.id).values_list('descendant_id', 'depth'))
+        if any(descendant_id == task.parent_task_id for descendant_id, _ in subtree):
+            raise ValueError("A task cannot be moved under one of its own subtasks")
+
+        # Drop every link from outside the subtree into it
+        subtree_ids = cls.objects.filter(ancestor_id=task.id).values('descendant_id')
+        cls.objects.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids
+        ).delete()
+
+        if not task.parent_task_id:
+            return
+
+        new_ancestors = cls.objects.filter(
+            descendant_id=task.parent_task_id
+        ).values_list('ancestor_id', 'depth')
+        cls.objects.bulk_create([
+            cls(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=ancestor_depth + descendant_depth + 1
+            )
+            for ancestor_id, ancestor_depth in new_ancestors
+            for descendant_id, descendant_depth in subtree
+        ], batch_size=1000)
     
     
 class TaskDependency(models.Model):
@@ -237,4 +413,105 @@ class TaskDependency(models.Model):
             
             self.group_id = existing.group_id if existing else str(uuid.uuid4())
         super().save(*args, **kwargs)
-        
\ No newline at end of file
+        
+
+class ScheduleEntry(models.Model):
+    """
+    Persisted placement of one task in the global schedule.
+    Written by the schedule cache whenever a new data version is computed,
+    so date-window (Gantt) queries read an index instead of re-running the
+    scheduler. version is the data version the row was last written for.
+    """
+    task = models.OneToOneField(Task, on_delete=models.CASCADE, related_name='schedule_entry')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='schedule_entries')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    version = models.BigIntegerField()
+
+    class Meta:
+        verbose_name_plural = "Schedule entries"
+        indexes = [
+            models.Index(fields=['start_date', 'end_date'], name='schedentry_window_idx'),
+            models.Index(fields=['user', 'start_date'], name='schedentry_user_start_idx'),
+            models.Index(fields=['project', 'start_date'], name='schedentry_project_start_idx'),
+            models.Index(fields=['version'], name='schedentry_version_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id}: {self.start_date} - {self.end_date}"
+
+
+class ScheduleVersion(models.Model):
+    """
+    Single row holding the version of the data the schedule is computed
+    from and the version last written to ScheduleEntry. Kept in the database
+    so every process agrees on them; writes bump data_version in their own
+    transaction.
+    """
+    data_version = models.BigIntegerField(default=0)
+    stored_version = models.BigIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"data {self.data_version}, stored {self.stored_version}"
+
+
+class ScheduleJob(models.Model):
+    """
+    A schedule computation run in the background by the local job pool.
+    Clients create one, then poll it for status, progress and the result.
+    Jobs only live in the pool of the process that queued them (worker);
+    see sweep_orphaned_jobs for what happens when that process goes away.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Waiting for a free worker'),
+        ('running', 'Running'),
+        ('succeeded', 'Finished'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='schedule_jobs'
+    )
+    project = models.ForeignKey(
+        Project,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        help_text="Limit the run to this project and the projects sharing its owners"
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="Limit the result to this user's workload"
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percent of projects placed")
+    version = models.BigIntegerField(null=True, blank=True, help_text="Data version the result was computed for")
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    worker = models.CharField(
+        max_length=255, blank=True, help_text="host:pid of the process whose pool runs the job"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Schedule job {self.id} ({self.status})"
@@ -0,0 +1,111 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedAtKeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created_at, id), newest first.
+
+    Each page is a range scan from the last row the client saw, so page 1000
+    costs the same as page 1: no COUNT(*) and no OFFSET. The cursor is an
+    opaque token holding the boundary row's created_at and id plus the
+    direction; ties on created_at are broken by id, so rows are never
+    skipped or repeated. Querysets should be backed by an index ending in
+    (created_at, id).
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        value = request.query_params.get(self.page_size_query_param)
+        if value and value.isdigit() and int(value) > 0:
+            return min(int(value), self.max_page_size)
+        return self.page_size
+
+    def decode_cursor(self, request):
+        """(reverse, created_at, id) from the request's cursor, or None on the first page"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            created_at = parse_datetime(data['t'])
+            pk = int(data['i'])
+            reverse = bool(data['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, created_at, pk
+
+    def encode_cursor(self, reverse, created_at, pk):
+        token = json.dumps({'r': int(reverse), 't': created_at.isoformat(), 'i': pk})
+        encoded = base64.urlsafe_b64encode(token.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        reverse = False
+        if cursor is not None:
+            reverse, created_at, pk = cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+
+        order = ('created_at', 'id') if reverse else ('-created_at', '-id')
+        rows = list(queryset.order_by(*order)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        # Paging backwards always came from a later page; paging forwards
+        # from any cursor always has an earlier one
+        has_next = True if reverse else has_more
+        has_previous = has_more if reverse else cursor is not None
+
+        self.next = self.previous = None
+        if rows:
+            if has_next:
+                self.next = self.encode_cursor(False, rows[-1].created_at, rows[-1].id)
+            if has_previous:
+                self.previous = self.encode_cursor(True, rows[0].created_at, rows[0].id)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.next,
+            'previous': self.previous,
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -2,10 +2,17 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from django.db.models import Q
+from django.db.models import Count, Prefetch, Q
 
-from ..models import Project
-from ..serializers import ProjectSerializer, ProjectDetailSerializer, TaskDetailSerializer
+from ..models import Project, Task
+from ..pagination import CreatedAtKeysetPagination
+from ..serializers import (
+    ProjectSerializer, ProjectDetailSerializer, TaskDetailSerializer,
+    parse_depth, parse_fields, subtask_depth, wants_field
+)
+from ..services.completion import get_completion_evaluator
+from ..services.dependency_graph import load_project_graph
+from ..services.task_tree import load_subtrees
 
 
 class ProjectViewSet(viewsets.ModelViewSet):
@@ -13,8 +20,10 @@ class ProjectViewSet(viewsets.ModelViewSet):
     Projects CRUD with nested task listing
     - Public read access for all projects
     - Requires authentication for write operations
+    - ?fields=id,title,tasks.id picks the returned fields, ?depth=N limits task nesting
     """
     queryset = Project.objects.all()
+    pagination_class = CreatedAtKeysetPagination
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -32,10 +41,22 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
+        context['fields'] = parse_fields(self.request.query_params.get('fields'))
+        context['depth'] = parse_depth(self.request.query_params.get('depth'))
         return context
 
     def get_queryset(self):
-        return super().get_queryset().all()
+        queryset = super().get_queryset()
+        if not wants_field(self.get_serializer_context(), 'task_ids'):
+            return queryset
+        # Root task ids for the whole page in one extra query (see ProjectSerializer.get_task_ids)
+        return queryset.prefetch_related(
+            Prefetch(
+                'tasks',
+                queryset=Task.objects.filter(parent_task__isnull=True).only('id', 'project_id'),
+                to_attr='root_tasks'
+            )
+        )
     
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def tasks(self, request, pk=None):
@@ -44,24 +65,47 @@ class ProjectViewSet(viewsets.ModelViewSet):
         - Shows public tasks or tasks owned by the user
         """
         project = self.get_object()
+        context = self.get_serializer_context()
         
         # Get visible tasks (public or owned by user)
         root_tasks = project.tasks.filter(
             Q(parent_task__isnull=True) & 
             (Q(is_private=False) | Q(owner=request.user))
         )
+        if wants_field(context, 'dependencies'):
+            root_tasks = root_tasks.prefetch_related('task_dependencies')
+        root_tasks = list(root_tasks)
+
+        # Every root's subtree in one closure-table query, nested from memory
+        # (none when the response renders no subtasks)
+        depth = subtask_depth(context)
+        subtasks, context['task_children'] = [], {}
+        if depth != 0:
+            subtasks = Task.objects.filter(Q(is_private=False) | Q(owner=request.user))
+            if wants_field(context, 'dependencies'):
+                subtasks = subtasks.prefetch_related('task_dependencies')
+            subtasks, context['task_children'] = load_subtrees(
+                subtasks, [task.id for task in root_tasks], depth
+            )
+        if wants_field(context, 'can_mark_complete'):
+            get_completion_evaluator(context).prime(task.id for task in root_tasks + subtasks)
         
-        # Completion stats
-        all_tasks = project.tasks.filter(
-            Q(is_private=False) | Q(owner=request.user)
-        )
-        completed_count = all_tasks.filter(completed=True).count()
-        total_count = all_tasks.count()
+        # Completion stats from the maintained counters: public tasks plus
+        # the user's own private ones (only queried when there are any)
+        total_count = project.task_count - project.private_task_count
+        completed_count = project.completed_task_count - project.completed_private_task_count
+        if project.private_task_count:
+            own_private = project.tasks.filter(is_private=True, owner=request.user).aggregate(
+                total=Count('id'),
+                completed=Count('id', filter=Q(completed=True))
+            )
+            total_count += own_private['total']
+            completed_count += own_private['completed']
         
         serializer = TaskDetailSerializer(
             root_tasks,
             many=True,
-            context={'request': request}
+            context=context
         )
         return Response({
             'tasks': serializer.data,
@@ -70,4 +114,23 @@ class ProjectViewSet(viewsets.ModelViewSet):
                 'total': total_count,
                 'percentage': round((completed_count/total_count*100) if total_count else 0, 2)
             }
-        })
\ No newline at end of file
+        })
+
+    @action(detail=True, methods=['get'], url_path='validate-dependencies',
+            permission_classes=[IsAuthenticated])
+    def validate_dependencies(self, request, pk=None):
+        """
+        Check the project's dependency graph for loops.
+        Returns every cyclic group of task ids in one response. Reads the
+        current rows rather than a cached snapshot.
+        """
+        project = self.get_object()
+        graph = load_project_graph(project.id)
+        cycles = graph.cycles()
+        return Response({
+            'project_id': project.id,
+            'valid': not cycles,
+            'task_count': len(graph),
+            'dependency_count': graph.edge_count(),
+            'cycles': cycles
+        })
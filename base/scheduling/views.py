@@ -1,14 +1,218 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.contrib.auth.models import User
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
+from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from base.models import Project, ScheduleEntry, ScheduleJob, Task
+from base.serializers import ScheduleJobSerializer, ScheduleScenarioBatchSerializer
+from base.services.scenarios import compare_scenarios
+from base.services.schedule_jobs import submit_job, sweep_orphaned_jobs
+from base.services.schedule_cache import current_version, schedule_cache, schedule_etag
 from base.services.scheduling import GlobalParallelScheduler
 
 
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+WINDOW_PARAMS = ('from', 'to', 'user', 'project')
+
+
+def ndjson_lines(entries):
+    for entry in entries:
+        yield json.dumps(entry, cls=DjangoJSONEncoder) + '\n'
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    return '*' in parse_etags(if_none_match) or etag in parse_etags(if_none_match)
+
+
 @api_view(['GET'])
 def global_schedule(request):
-    """Generate schedule for all projects"""
+    """
+    Generate schedule for all projects.
+    Results are cached per data version and carry an ETag; send If-None-Match
+    to get a 304 when nothing changed. With ?stream=ndjson the entries are
+    streamed one JSON object per line, in start-date order, instead of as a
+    single JSON document.
+    With any of ?from=&to= (YYYY-MM-DD), ?user= or ?project= only the tasks
+    overlapping that window are returned, read from the stored schedule.
+    """
+    version = current_version()
+    if etag_matches(request, schedule_etag(version)):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': schedule_etag(version)})
+
+    try:
+        if any(param in request.query_params for param in WINDOW_PARAMS):
+            return schedule_window(request)
+        schedule, served_version = schedule_cache.get()
+        if request.query_params.get('stream') == 'ndjson':
+            response = StreamingHttpResponse(
+                ndjson_lines(schedule['schedule']),
+                content_type=NDJSON_CONTENT_TYPE
+            )
+            response['ETag'] = schedule_etag(served_version)
+            return response
+        return Response(schedule, headers={'ETag': schedule_etag(served_version)})
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+
+def schedule_window(request):
+    """Entries overlapping the requested dates/user/project, from ScheduleEntry"""
+    filters = {}
+    for param, lookup in (('from', 'end_date__gte'), ('to', 'start_date__lte')):
+        value = request.query_params.get(param)
+        if value:
+            try:
+                filters[lookup] = parse_date(value)
+            except ValueError:
+                filters[lookup] = None
+            if filters[lookup] is None:
+                return Response({'error': f"'{param}' must be a date (YYYY-MM-DD)"}, status=400)
+    for param, lookup in (('user', 'user_id'), ('project', 'project_id')):
+        value = request.query_params.get(param)
+        if value:
+            if not value.isdigit():
+                return Response({'error': f"'{param}' must be an id"}, status=400)
+            filters[lookup] = int(value)
+
+    # Make sure the table holds a computed version; no-op when it is current
+    _, served_version = schedule_cache.get()
+
+    fields = ('id', 'title', 'start_date', 'end_date', 'assignee', 'duration_days', 'project_id', 'project_title')
+    schedule = [
+        dict(zip(fields, row))
+        for row in ScheduleEntry.objects.filter(**filters).order_by('start_date', 'task_id').values_list(
+            'task_id', 'task__title', 'start_date', 'end_date', 'user__username',
+            'task__duration_days', 'project_id', 'project__title'
+        )
+    ]
+    return Response(
+        {
+            'schedule': schedule,
+            'start_date': min((entry['start_date'] for entry in schedule), default=None),
+            'end_date': max((entry['end_date'] for entry in schedule), default=None)
+        },
+        headers={'ETag': schedule_etag(served_version)}
+    )
+
+
+def scoped_schedule(request, project_ids=None, user_id=None):
+    """
+    Schedule for the projects related to project_ids / user_id through shared
+    owners, which is exactly what a global run would give them. Served from
+    the cached global schedule when it is current, otherwise only that part
+    of the graph is loaded and placed.
+    """
+    version = current_version()
+    etag = schedule_etag(version)
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
     scheduler = GlobalParallelScheduler()
     try:
-        schedule = scheduler.generate_schedule()
-        return Response(schedule)
+        related = scheduler.related_project_ids(project_ids, user_id)
+        cached = schedule_cache.peek(version)
+        if cached is None:
+            result = scheduler.generate_scoped_schedule(project_ids, user_id, related=related)
+            return Response(result, headers={'ETag': etag})
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    related_set = set(related)
+    schedule = [entry for entry in cached['schedule'] if entry['project_id'] in related_set]
+    if user_id is not None:
+        owned = set(
+            Task.objects.filter(owner_id=user_id, project_id__in=related).values_list('id', flat=True)
+        )
+        schedule = [entry for entry in schedule if entry['id'] in owned]
+
+    return Response(
+        {'project_ids': related, **scheduler._build_result(schedule)},
+        headers={'ETag': etag}
+    )
+
+
+@api_view(['GET'])
+def project_schedule(request, project_id):
+    """
+    Schedule for one project and every project that shares task owners with
+    it (directly or through other projects), since those compete for the
+    same people.
+    """
+    project = get_object_or_404(Project, pk=project_id)
+    return scoped_schedule(request, project_ids=[project.id])
+
+
+@api_view(['GET'])
+def user_schedule(request, user_id):
+    """
+    One user's workload: the scheduled tasks they own, computed from only
+    the projects that affect their availability.
+    """
+    user = get_object_or_404(User, pk=user_id)
+    return scoped_schedule(request, user_id=user.id)
+
+
+@api_view(['POST'])
+def create_schedule_job(request):
+    """
+    Start a schedule computation in the background and return the job at
+    once (202). Optional "project" and "user" limit the run like the scoped
+    schedule endpoints. Poll the job's URL for status, progress and result.
+    """
+    serializer = ScheduleJobSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    job = serializer.save(requested_by=request.user)
+    submit_job(job)
+    return Response(
+        ScheduleJobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': reverse('schedule-job-detail', args=[job.id])}
+    )
+
+
+@api_view(['GET'])
+def schedule_job_detail(request, job_id):
+    """Status, progress and (once finished) the result of one of your jobs"""
+    sweep_orphaned_jobs()
+    job = get_object_or_404(ScheduleJob, pk=job_id, requested_by=request.user)
+    return Response(ScheduleJobSerializer(job).data)
+
+
+@api_view(['POST'])
+def schedule_scenarios(request):
+    """
+    What-if analysis: schedule the current data once as a baseline and once
+    per scenario (owner changes, duration changes, added or removed
+    dependencies), in parallel worker processes, and compare makespan and
+    per-project end dates. Nothing is saved.
+    """
+    serializer = ScheduleScenarioBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        return Response(compare_scenarios(serializer.validated_data['scenarios'], serializer.usernames))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+
+@api_view(['GET'])
+def project_critical_path(request, project_id):
+    """
+    Critical path analysis for one project: earliest/latest dates and slack
+    per task plus the critical chain. Durations and dependencies only; user
+    availability is not taken into account.
+    """
+    project = get_object_or_404(Project, pk=project_id)
+    try:
+        return Response(GlobalParallelScheduler().analyze_critical_path(project.id))
     except ValueError as e:
-        return Response({'error': str(e)}, status=400)
\ No newline at end of file
+        return Response({'error': str(e)}, status=400)
@@ -1,13 +1,83 @@
-from collections import defaultdict
 from time import timezone
 import uuid
 from rest_framework import serializers
-from .models import Project, Task, TaskDependency
+from .models import Project, ScheduleJob, Task, TaskDependency
+from .services.completion import get_completion_evaluator
+from .services.dependency_graph import creates_circular_dependency
+from .services.task_tree import load_subtrees
 from django.contrib.auth.models import User
 from django.db import models
 
 
 
+def parse_fields(value):
+    """
+    Parse a ?fields= value such as "id,title,tasks.id,tasks.title" into
+    {'id': {}, 'title': {}, 'tasks': {'id': {}, 'title': {}}}.
+    Returns None (every field) when the parameter is missing or empty.
+    """
+    if not value:
+        return None
+    requested = {}
+    for path in value.split(','):
+        node = requested
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return requested or None
+
+
+def parse_depth(value):
+    """Parse ?depth= into a non-negative int, or None for unlimited nesting"""
+    if value in (None, ''):
+        return None
+    if not value.isdigit():
+        raise serializers.ValidationError({'depth': 'Depth must be a non-negative integer.'})
+    return int(value)
+
+
+def wants_field(context, name):
+    """Whether a serializer using this context will render the field"""
+    requested = context.get('fields')
+    return not requested or name in requested
+
+
+def subtask_depth(context):
+    """
+    Levels of subtasks a task serializer using this context nests: 0 when
+    ?fields= leaves subtasks out, None for unlimited.
+    """
+    return context.get('depth') if wants_field(context, 'subtasks') else 0
+
+
+class SparseFieldsMixin:
+    """
+    Output only the fields requested with ?fields= (context['fields'], see
+    parse_fields). Fields that are left out are skipped before rendering,
+    so their SerializerMethodFields are never evaluated. Input fields are
+    unaffected.
+    """
+    def get_excluded_fields(self):
+        return set()
+
+    @property
+    def _readable_fields(self):
+        requested = self.context.get('fields')
+        excluded = self.get_excluded_fields()
+        for field in super()._readable_fields:
+            if field.field_name in excluded:
+                continue
+            if requested and field.field_name not in requested:
+                continue
+            yield field
+
+    def nested_context(self, name, **extra):
+        """Context for a nested serializer rendering the field called name"""
+        get_completion_evaluator(self.context)  # shared by every copy of the context
+        requested = self.context.get('fields')
+        return {**self.context, 'fields': (requested or {}).get(name) or None, **extra}
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Basic user serializer exposing safe fields (id, username, email)."""
     class Meta:
@@ -16,7 +86,19 @@ class UserSerializer(serializers.ModelSerializer):
 
 
     
-class TaskSerializer(serializers.ModelSerializer):
+class TaskBatchListSerializer(serializers.ListSerializer):
+    """
+    List serializer for tasks that evaluates can_mark_complete for every row
+    in one batch before rendering them.
+    """
+    def to_representation(self, data):
+        tasks = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if wants_field(self.context, 'can_mark_complete'):
+            get_completion_evaluator(self.context).prime(task.id for task in tasks)
+        return super().to_representation(tasks)
+
+
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Main task serializer with core fields and dependency logic.
     Includes validation for project/parent relationships and completion rules.
@@ -68,32 +150,50 @@ class TaskSerializer(serializers.ModelSerializer):
             'id', 'project', 'parent_task', 'owner', 'title', 
             'description', 'duration_days', 'is_private', 'completed',
             'completed_at', 'created_at', 'can_mark_complete', 
-            'dependencies'
+            'dependencies', 'descendant_count', 'completed_descendant_count'
         ]
-        read_only_fields = ['completed_at', 'created_at', 'can_mark_complete']
+        read_only_fields = [
+            'completed_at', 'created_at', 'can_mark_complete',
+            'descendant_count', 'completed_descendant_count'
+        ]
+        list_serializer_class = TaskBatchListSerializer
 
     def get_dependencies(self, obj):
-        deps = obj.task_dependencies.all()
-        if not deps.exists():
-            return []
-            
-        grouped = defaultdict(list)
-        for dep in deps:
-            grouped[dep.logic].append(dep.depends_on_id)
-            
-        return [{
-            'logic': logic,
-            'depends_on': task_ids,
-            'condition': deps.filter(logic=logic).first().condition
-        } for logic, task_ids in grouped.items()]
+        """
+        Dependencies grouped by logic, built in one pass over task_dependencies.
+        Reads the prefetch cache when the view prefetched 'task_dependencies'.
+        'condition' keeps the first member's condition for older clients;
+        'items' reports the condition of every dependency.
+        """
+        grouped = {}
+        for dep in obj.task_dependencies.all():
+            group = grouped.get(dep.logic)
+            if group is None:
+                group = grouped[dep.logic] = {
+                    'logic': dep.logic,
+                    'depends_on': [],
+                    'condition': dep.condition,
+                    'items': []
+                }
+            group['depends_on'].append(dep.depends_on_id)
+            group['items'].append({
+                'id': dep.id,
+                'depends_on': dep.depends_on_id,
+                'condition': dep.condition
+            })
+
+        return list(grouped.values())
     
     def get_can_mark_complete(self, obj):
-        """Enhanced version with permission check"""
+        """
+        Enhanced version with permission check.
+        Uses the shared per-request CompletionEvaluator instead of querying per row.
+        """
         try:
             user = self.context['request'].user
-            if obj.is_private and obj.owner != user:
+            if obj.is_private and obj.owner_id != user.id:
                 return False
-            return obj.can_mark_complete() if hasattr(obj, 'can_mark_complete') else False
+            return get_completion_evaluator(self.context).can_mark_complete(obj)
         except:
             return False
 
@@ -112,6 +212,14 @@ class TaskSerializer(serializers.ModelSerializer):
                     "Subtasks must belong to the same project as their parent."
                 )
         
+        if self.instance and data.get('parent_task'):
+            new_parent = data['parent_task']
+            if (new_parent.pk == self.instance.pk or
+                    self.instance.get_descendants().filter(pk=new_parent.pk).exists()):
+                raise serializers.ValidationError(
+                    "A task cannot be moved under one of its own subtasks."
+                )
+        
         if 'completed' in data:
             instance = self.instance
             if instance and instance.subtasks.exists() and data['completed']:
@@ -158,6 +266,8 @@ class TaskDetailSerializer(TaskSerializer):
     """
     Extended task serializer with nested subtask hierarchy.
     Optionally hides parent_task field based on context.
+    context['depth'] (?depth=) limits how many levels of subtasks are nested;
+    at depth 0 the subtasks field is left out.
     """
     subtasks = serializers.SerializerMethodField()
     
@@ -166,13 +276,41 @@ class TaskDetailSerializer(TaskSerializer):
         read_only_fields = TaskSerializer.Meta.read_only_fields
         
     def get_subtasks(self, obj):
-        """Recursively serialize all subtasks"""
-        subtasks = obj.get_all_subtasks()
+        """
+        Recursively serialize all subtasks, nesting only direct children.
+        When the view has already linked the tree in memory (context['task_children']),
+        no queries are issued. Otherwise the top-level task loads its subtree
+        (down to the depth limit) in one closure-table query and links it the
+        same way, so nested levels reuse it.
+        """
+        depth = self.context.get('depth')
+        # Subtasks render the same fields as their parent unless "subtasks.x" was asked for
+        context = self.nested_context('subtasks', depth=None if depth is None else depth - 1)
+        if not context['fields']:
+            context['fields'] = self.context.get('fields')
+
+        children = self.context.get('task_children')
+        if children is None:
+            subtasks = Task.objects.order_by('ancestor_links__depth', '-created_at')
+            request = self.context.get('request')
+            if request is not None:
+                # Same visibility as TaskViewSet.get_visible_tasks()
+                subtasks = subtasks.filter(models.Q(is_private=False) | models.Q(owner=request.user))
+            if wants_field(context, 'dependencies'):
+                subtasks = subtasks.prefetch_related('task_dependencies')
+            subtasks, children = load_subtrees(subtasks, [obj.id], depth)
+            if wants_field(context, 'can_mark_complete'):
+                get_completion_evaluator(context).prime(task.id for task in subtasks)
+            context['task_children'] = children
+
         return TaskDetailSerializer(
-            subtasks, 
-            many=True, 
-            context=self.context
+            children.get(obj.id, []),
+            many=True,
+            context=context
         ).data
+
+    def get_excluded_fields(self):
+        return {'subtasks'} if self.context.get('depth') == 0 else set()
         
     def to_representation(self, instance):
         """Remove parent_task when hide_parent is True"""
@@ -181,7 +319,7 @@ class TaskDetailSerializer(TaskSerializer):
             representation.pop('parent_task', None)
         return representation
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Project serializer with basic fields and root task references.
     Defaults start_date to current date.
@@ -196,7 +334,10 @@ class ProjectSerializer(serializers.ModelSerializer):
         fields = ['id', 'owner', 'title', 'description', 'start_date', 'created_at', 'task_ids']  
     
     def get_task_ids(self, obj):
-        # Get all root tasks (no parent) that are either public or owned by authenticated user
+        # Get all root tasks (no parent); uses the view's root_tasks prefetch when present
+        root_tasks = getattr(obj, 'root_tasks', None)
+        if root_tasks is not None:
+            return [task.id for task in root_tasks]
         tasks = obj.tasks.filter(parent_task__isnull=True)    
         return list(tasks.values_list('id', flat=True))
     
@@ -204,22 +345,112 @@ class ProjectDetailSerializer(ProjectSerializer):
     """
     Detailed project serializer including visible root tasks.
     Filters private tasks based on current user permissions.
+    ?fields=tasks.id,tasks.title picks the task fields; with ?depth= above 1
+    each task also nests its subtasks down to that many levels in total,
+    and depth 0 leaves tasks out.
     """
     tasks = serializers.SerializerMethodField()
     
     def get_tasks(self, obj):
         """Get all root tasks visible to the current user"""
         user = self.context['request'].user
-        tasks = obj.tasks.filter(
-            models.Q(is_private=False) | 
-            models.Q(owner=user),
-            parent_task__isnull=True
-        )
-        return TaskSerializer(tasks, many=True, context=self.context).data
+        visible = models.Q(is_private=False) | models.Q(owner=user)
+        tasks = obj.tasks.filter(visible, parent_task__isnull=True)
+        depth = self.context.get('depth')
+        context = self.nested_context('tasks', depth=None if depth is None else depth - 1)
+        if wants_field(context, 'dependencies'):
+            tasks = tasks.prefetch_related('task_dependencies')
+        if depth is not None and depth > 1:
+            # Every root's visible subtree in one query, nested by TaskDetailSerializer
+            # from memory (skipped when ?fields= leaves subtasks out)
+            tasks = list(tasks)
+            subtasks, context['task_children'] = [], {}
+            if subtask_depth(context) != 0:
+                subtasks = Task.objects.filter(visible)
+                if wants_field(context, 'dependencies'):
+                    subtasks = subtasks.prefetch_related('task_dependencies')
+                subtasks, context['task_children'] = load_subtrees(
+                    subtasks, [task.id for task in tasks], subtask_depth(context)
+                )
+            if wants_field(context, 'can_mark_complete'):
+                get_completion_evaluator(context).prime(task.id for task in tasks + subtasks)
+            return TaskDetailSerializer(tasks, many=True, context=context).data
+        return TaskSerializer(tasks, many=True, context=context).data
+
+    def get_excluded_fields(self):
+        return {'tasks'} if self.context.get('depth') == 0 else set()
 
     class Meta(ProjectSerializer.Meta):
         fields = ProjectSerializer.Meta.fields + ['tasks'] 
 
+class TaskBulkCompletionSerializer(serializers.Serializer):
+    """Payload for completing or reopening a batch of tasks in one request."""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000
+    )
+    completed = serializers.BooleanField()
+
+
+class ScheduleJobSerializer(serializers.ModelSerializer):
+    """Background schedule job; only project and user are set by the client"""
+    class Meta:
+        model = ScheduleJob
+        fields = [
+            'id', 'status', 'progress', 'project', 'user', 'version',
+            'result', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'progress', 'version',
+            'result', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+
+
+class ScenarioOwnerChangeSerializer(serializers.Serializer):
+    task = serializers.IntegerField(min_value=1)
+    owner = serializers.IntegerField(min_value=1, allow_null=True)
+
+
+class ScenarioDurationChangeSerializer(serializers.Serializer):
+    task = serializers.IntegerField(min_value=1)
+    duration_days = serializers.IntegerField(min_value=1)
+
+
+class ScenarioDependencySerializer(serializers.Serializer):
+    task = serializers.IntegerField(min_value=1)
+    depends_on = serializers.IntegerField(min_value=1)
+
+
+class ScheduleScenarioSerializer(serializers.Serializer):
+    """One what-if scenario: overrides applied on top of the current data."""
+    name = serializers.CharField(max_length=200, required=False, allow_blank=True)
+    owner_changes = ScenarioOwnerChangeSerializer(many=True, required=False)
+    duration_changes = ScenarioDurationChangeSerializer(many=True, required=False)
+    add_dependencies = ScenarioDependencySerializer(many=True, required=False)
+    remove_dependencies = ScenarioDependencySerializer(many=True, required=False)
+
+
+class ScheduleScenarioBatchSerializer(serializers.Serializer):
+    """Payload for comparing several what-if scenarios against the current schedule."""
+    scenarios = ScheduleScenarioSerializer(many=True, allow_empty=False, max_length=50)
+
+    def validate_scenarios(self, value):
+        owner_ids = {
+            change['owner']
+            for scenario in value
+            for change in scenario.get('owner_changes', ())
+            if change['owner'] is not None
+        }
+        self.usernames = dict(User.objects.filter(id__in=owner_ids).values_list('id', 'username'))
+        missing = sorted(owner_ids - set(self.usernames))
+        if missing:
+            raise serializers.ValidationError(
+                f"Unknown users: {', '.join(map(str, missing))}"
+            )
+        return value
+
+
 class TaskListSerializer(serializers.ModelSerializer):
     """Minimal task serializer for list views with essential fields only."""
     class Meta:
@@ -284,30 +515,7 @@ class SmartDependencySerializer(serializers.Serializer):
 
     def _creates_circular_dependency(self, task, depends_on):
         """Check if adding this dependency would create a loop"""
-        if TaskDependency.objects.filter(
-            task=depends_on,
-            depends_on=task
-        ).exists():
-            return True
-        
-        visited = set()
-        queue = [depends_on]
-        
-        while queue:
-            current = queue.pop()
-            if current.id == task.id:
-                return True
-            if current.id in visited:
-                continue
-            visited.add(current.id)
-            
-            dependencies = TaskDependency.objects.filter(
-                task=current
-            ).select_related('depends_on')
-            
-            queue.extend([dep.depends_on for dep in dependencies])
-        
-        return False
+        return creates_circular_dependency(task, depends_on)
 
     def create(self, validated_data):
         task = validated_data['task']
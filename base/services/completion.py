@@ -0,0 +1,141 @@
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import record_task_changes
+from .rollup import rollup_completion
+
+
+def _get_task_model():
+    return apps.get_model('base', 'Task')
+
+
+def _get_dependency_model():
+    return apps.get_model('base', 'TaskDependency')
+
+
+def condition_met(condition, depends_on_completed):
+    """
+    Evaluate a TaskDependency condition against the completion state of the
+    task it depends on. Tasks carry no "started" state, so 'in_progress'
+    dependencies are never satisfied.
+    """
+    if condition == 'completed':
+        return depends_on_completed
+    if condition == 'not_completed':
+        return not depends_on_completed
+    return False
+
+
+def evaluate_completion(task_ids, assume_completed=()):
+    """
+    Batch version of Task.can_mark_complete.
+
+    Returns {task_id: bool} using one subtask query and one dependency query,
+    whatever the number of tasks. Tasks listed in assume_completed are treated
+    as already complete, so a batch can complete a parent together with its
+    subtasks or a task together with the tasks it depends on.
+    """
+    Task = _get_task_model()
+    TaskDependency = _get_dependency_model()
+    task_ids = set(task_ids)
+    assume_completed = set(assume_completed)
+    result = dict.fromkeys(task_ids, True)
+    if not task_ids:
+        return result
+
+    # Subtasks: blocked by any incomplete child the batch is not completing
+    for parent_id, child_id in Task.objects.filter(
+        parent_task_id__in=task_ids,
+        completed=False
+    ).values_list('parent_task_id', 'id'):
+        if child_id not in assume_completed:
+            result[parent_id] = False
+
+    # Dependencies: each group is AND/OR over its members, by the first member's logic
+    groups = defaultdict(list)
+    for task_id, group_id, logic, condition, depends_on_id, depends_on_completed in (
+        TaskDependency.objects.filter(task_id__in=task_ids).values_list(
+            'task_id', 'group_id', 'logic', 'condition',
+            'depends_on_id', 'depends_on__completed'
+        ).order_by('id')
+    ):
+        completed = depends_on_completed or depends_on_id in assume_completed
+        groups[(task_id, group_id)].append((logic, condition_met(condition, completed)))
+
+    for (task_id, _), members in groups.items():
+        group_logic = members[0][0]
+        satisfied = [met for _, met in members]
+        if group_logic == 'AND' and not all(satisfied):
+            result[task_id] = False
+        elif group_logic == 'OR' and not any(satisfied):
+            result[task_id] = False
+
+    return result
+
+
+def set_completion(tasks, completed):
+    """
+    Complete or reopen many tasks at once.
+
+    Writes every changed task with a single bulk_update, adjusts the
+    completion counters and then runs one completion rollup over the union
+    of their parents. Validation is the
+    caller's job (see evaluate_completion). Returns (changed_ids, rolled_up)
+    where rolled_up is the (completed_ids, reopened_ids) pair from the rollup.
+    """
+    Task = _get_task_model()
+    tasks = list(tasks)
+    now = timezone.now()
+
+    with transaction.atomic():
+        # Compare against the stored rows, not the caller's possibly stale instances
+        stored = {
+            task_id: (project_id, is_private, is_completed)
+            for task_id, project_id, is_private, is_completed in Task.objects.select_for_update().filter(
+                id__in=[task.id for task in tasks]
+            ).values_list('id', 'project_id', 'is_private', 'completed')
+        }
+        changed = [task for task in tasks if task.id in stored and stored[task.id][2] != completed]
+        counter_changes = []
+        for task in changed:
+            before = stored[task.id]
+            task.completed = completed
+            task.completed_at = now if completed else None
+            counter_changes.append((task.id, before, before[:2] + (completed,)))
+
+        Task.objects.bulk_update(changed, ['completed', 'completed_at'], batch_size=500)
+        record_task_changes(counter_changes)
+        rolled_up = rollup_completion({task.parent_task_id for task in changed})
+
+    return {task.id for task in changed}, rolled_up
+
+
+class CompletionEvaluator:
+    """
+    Per-request cache of can_mark_complete results.
+
+    Serializers share one instance through their context. List serializers and
+    tree views prime it with every task id they are about to render, so a whole
+    page is evaluated by evaluate_completion's two queries instead of several
+    queries per row.
+    """
+    def __init__(self):
+        self._results = {}
+
+    def prime(self, task_ids):
+        missing = set(task_ids) - self._results.keys()
+        if missing:
+            self._results.update(evaluate_completion(missing))
+
+    def can_mark_complete(self, task):
+        if task.id not in self._results:
+            self.prime([task.id])
+        return self._results[task.id]
+
+
+def get_completion_evaluator(context):
+    """Return the evaluator stored in a serializer context, creating it on first use"""
+    return context.setdefault('completion_evaluator', CompletionEvaluator())
@@ -0,0 +1,201 @@
+from collections import defaultdict
+
+from django.apps import apps
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, QuerySet, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+
+TASK_COUNTERS = ('descendant_count', 'completed_descendant_count')
+PROJECT_COUNTERS = ('task_count', 'completed_task_count', 'private_task_count', 'completed_private_task_count')
+CASE_BATCH_SIZE = 500
+
+
+def task_state(task):
+    """The fields counters depend on, as stored in a task's counter state tuple"""
+    return (task.project_id, task.is_private, task.completed)
+
+
+def _add_deltas(model, deltas, fields):
+    """Add per-row deltas ({pk: [delta per field]}) to counter columns, 500 rows per UPDATE"""
+    rows = [(pk, values) for pk, values in deltas.items() if any(values)]
+    for start in range(0, len(rows), CASE_BATCH_SIZE):
+        batch = rows[start:start + CASE_BATCH_SIZE]
+        updates = {}
+        for position, field in enumerate(fields):
+            whens = [When(pk=pk, then=Value(values[position])) for pk, values in batch if values[position]]
+            if whens:
+                updates[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+        model.objects.filter(pk__in=[pk for pk, _ in batch]).update(**updates)
+
+
+def adjust_ancestor_counters(deltas):
+    """
+    Add (total, completed) deltas ({task_id: (total, completed)}) to the
+    descendant counters of every ancestor of each task.
+    One closure-table read and one UPDATE per 500 ancestors.
+    """
+    deltas = {task_id: delta for task_id, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    Task = apps.get_model('base', 'Task')
+    TaskClosure = apps.get_model('base', 'TaskClosure')
+
+    totals = defaultdict(lambda: [0, 0])
+    for ancestor_id, descendant_id in TaskClosure.objects.filter(
+        descendant_id__in=deltas, depth__gt=0
+    ).values_list('ancestor_id', 'descendant_id'):
+        total, completed = deltas[descendant_id]
+        totals[ancestor_id][0] += total
+        totals[ancestor_id][1] += completed
+    _add_deltas(Task, totals, TASK_COUNTERS)
+
+
+def record_task_changes(changes, ancestors=True):
+    """
+    Update counters for tasks that were created, deleted or changed in place.
+
+    changes is an iterable of (task_id, before, after) where before/after are
+    task_state() tuples, or None for a task that did not exist. Project
+    counters follow project_id, is_private and completed; ancestor counters
+    (skipped with ancestors=False, e.g. when the subtree is re-counted as a
+    whole after a move) follow existence and completed.
+    """
+    Project = apps.get_model('base', 'Project')
+
+    task_deltas = {}
+    project_deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for task_id, before, after in changes:
+        total = completed = 0
+        for state, sign in ((before, -1), (after, 1)):
+            if state is None:
+                continue
+            project_id, is_private, is_completed = state
+            total += sign
+            completed += sign * is_completed
+            if project_id is not None:
+                row = project_deltas[project_id]
+                row[0] += sign
+                row[1] += sign * is_completed
+                row[2] += sign * is_private
+                row[3] += sign * (is_private and is_completed)
+        task_deltas[task_id] = (total, completed)
+
+    if ancestors:
+        adjust_ancestor_counters(task_deltas)
+    _add_deltas(Project, project_deltas, PROJECT_COUNTERS)
+
+
+def shift_subtree_counters(task_id, sign):
+    """
+    Remove (sign=-1) or add (sign=1) the whole subtree rooted at task_id
+    to the counters of its current ancestors, e.g. around a move.
+    """
+    Task = apps.get_model('base', 'Task')
+    completed, descendants, completed_descendants = Task.objects.filter(pk=task_id).values_list(
+        'completed', *TASK_COUNTERS
+    ).get()
+    adjust_ancestor_counters({
+        task_id: (sign * (1 + descendants), sign * (int(completed) + completed_descendants))
+    })
+
+
+def remove_subtree_counters(task_id):
+    """
+    Take the subtree rooted at task_id, which is about to be deleted, out of
+    its ancestors' and projects' counters in one pass (five queries however
+    big the subtree is). Must run while its closure rows still exist.
+    """
+    Task = apps.get_model('base', 'Task')
+    Project = apps.get_model('base', 'Project')
+
+    shift_subtree_counters(task_id, -1)
+    project_deltas = {}
+    for project_id, total, completed, private, completed_private in Task.objects.filter(
+        ancestor_links__ancestor_id=task_id,
+        project_id__isnull=False
+    ).order_by().values('project_id').annotate(
+        n_total=Count('pk'),
+        n_completed=Count('pk', filter=Q(completed=True)),
+        n_private=Count('pk', filter=Q(is_private=True)),
+        n_completed_private=Count('pk', filter=Q(is_private=True, completed=True))
+    ).values_list('project_id', 'n_total', 'n_completed', 'n_private', 'n_completed_private'):
+        project_deltas[project_id] = [-total, -completed, -private, -completed_private]
+    _add_deltas(Project, project_deltas, PROJECT_COUNTERS)
+
+
+def deletion_roots(origin):
+    """
+    Ids of the topmost tasks a delete() of origin removes: the deleted
+    tasks whose parent survives. Their subtrees are everything the delete
+    cascades to. origin is a Task, Project or User instance or queryset;
+    returns None for anything else. Computed once and kept on origin, as
+    pre_delete is sent for every task of the delete.
+    """
+    roots = getattr(origin, '_deleted_task_roots', None)
+    if roots is not None:
+        return roots
+
+    Task = apps.get_model('base', 'Task')
+    TaskClosure = apps.get_model('base', 'TaskClosure')
+    Project = apps.get_model('base', 'Project')
+    User = Task.owner.field.related_model
+
+    if isinstance(origin, Task):
+        roots = {origin.pk}
+    else:
+        many = isinstance(origin, QuerySet)
+        model = origin.model if many else type(origin)
+        origins = origin if many else [origin]
+        if model is Task:
+            seeds = origin.values('pk') if many else Task.objects.filter(pk=origin.pk).values('pk')
+        elif model is Project:
+            seeds = Task.objects.filter(project__in=origins).values('pk')
+        elif model is User:
+            seeds = Task.objects.filter(
+                Q(owner__in=origins) | Q(project__owner__in=origins)
+            ).values('pk')
+        else:
+            return None
+        seeds = seeds.order_by()
+        roots = set(seeds.values_list('pk', flat=True)) - set(TaskClosure.objects.filter(
+            descendant_id__in=seeds,
+            ancestor_id__in=seeds,
+            depth__gt=0
+        ).values_list('descendant_id', flat=True))
+
+    origin._deleted_task_roots = roots
+    return roots
+
+
+def rebuild_counters():
+    """
+    Recompute every task and project counter from scratch, one UPDATE per
+    table. For repairs after raw SQL or queryset.update() writes, which
+    bypass incremental maintenance.
+    """
+    Task = apps.get_model('base', 'Task')
+    TaskClosure = apps.get_model('base', 'TaskClosure')
+    Project = apps.get_model('base', 'Project')
+
+    def count(queryset, group_by):
+        return Coalesce(
+            Subquery(
+                queryset.values(group_by).annotate(total=Count('pk')).values('total')
+            ),
+            Value(0)
+        )
+
+    below = TaskClosure.objects.filter(ancestor_id=OuterRef('pk'), depth__gt=0).order_by()
+    tasks = Task.objects.update(
+        descendant_count=count(below, 'ancestor_id'),
+        completed_descendant_count=count(below.filter(descendant__completed=True), 'ancestor_id')
+    )
+
+    owned = Task.objects.filter(project_id=OuterRef('pk')).order_by()
+    projects = Project.objects.update(
+        task_count=count(owned, 'project_id'),
+        completed_task_count=count(owned.filter(completed=True), 'project_id'),
+        private_task_count=count(owned.filter(is_private=True), 'project_id'),
+        completed_private_task_count=count(owned.filter(Q(is_private=True, completed=True)), 'project_id')
+    )
+    return tasks, projects
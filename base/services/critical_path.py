@@ -0,0 +1,195 @@
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: the pure-Python passes below are used instead
+    np = None
+
+from base.services.dependency_graph import find_cycles
+
+
+CriticalPath = namedtuple(
+    'CriticalPath',
+    'task_ids earliest_start earliest_finish latest_start latest_finish slack chain duration'
+)
+
+
+def _csr(size, sources, targets):
+    """Group edges by source: returns (offsets, targets sorted by source)"""
+    order = sorted(range(len(sources)), key=sources.__getitem__)
+    offsets = [0] * (size + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+    return offsets, [targets[i] for i in order]
+
+
+def _levels(size, offsets, targets):
+    """
+    Kahn's algorithm one frontier at a time. Returns the topological level of
+    every node (longest edge count from a source), or None if there is a cycle.
+    """
+    in_degree = [0] * size
+    for target in targets:
+        in_degree[target] += 1
+
+    level = [0] * size
+    frontier = [node for node in range(size) if in_degree[node] == 0]
+    seen = len(frontier)
+    depth = 0
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            level[node] = depth
+            for target in targets[offsets[node]:offsets[node + 1]]:
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    next_frontier.append(target)
+        seen += len(next_frontier)
+        frontier = next_frontier
+        depth += 1
+    return level if seen == size else None
+
+
+def _numpy_edges_by_level(node_level, ends, levels):
+    """Edge positions sorted by the level of one endpoint, with per-level bounds"""
+    order = np.argsort(node_level[ends], kind='stable')
+    bounds = np.searchsorted(node_level[ends][order], np.arange(levels + 1))
+    return order, bounds
+
+
+def _forward_numpy(durations, sources, targets, level):
+    """Earliest starts as array operations, one topological level at a time"""
+    duration = np.asarray(durations, dtype=np.int64)
+    src = np.asarray(sources, dtype=np.int64)
+    dst = np.asarray(targets, dtype=np.int64)
+    node_level = np.asarray(level, dtype=np.int64)
+    levels = int(node_level.max()) + 1 if len(node_level) else 0
+
+    es = np.zeros(len(duration), dtype=np.int64)
+    if len(dst):
+        # Edges sorted by the level of their target: each slice only reads finished levels
+        by_target, bounds = _numpy_edges_by_level(node_level, dst, levels)
+        for lvl in range(1, levels):
+            edges = by_target[bounds[lvl]:bounds[lvl + 1]]
+            np.maximum.at(es, dst[edges], es[src[edges]] + duration[src[edges]])
+    return es.tolist()
+
+
+def _backward_numpy(durations, sources, targets, level, finish):
+    """Latest finishes as array operations, from the last topological level back"""
+    duration = np.asarray(durations, dtype=np.int64)
+    src = np.asarray(sources, dtype=np.int64)
+    dst = np.asarray(targets, dtype=np.int64)
+    node_level = np.asarray(level, dtype=np.int64)
+    levels = int(node_level.max()) + 1 if len(node_level) else 0
+
+    lf = np.full(len(duration), finish, dtype=np.int64)
+    if len(src):
+        by_source, bounds = _numpy_edges_by_level(node_level, src, levels)
+        for lvl in range(levels - 1, -1, -1):
+            edges = by_source[bounds[lvl]:bounds[lvl + 1]]
+            np.minimum.at(lf, src[edges], lf[dst[edges]] - duration[dst[edges]])
+    return lf.tolist()
+
+
+def _forward_python(durations, sources, targets, level):
+    incoming = [[] for _ in durations]
+    for source, target in zip(sources, targets):
+        incoming[target].append(source)
+
+    es = [0] * len(durations)
+    for node in sorted(range(len(durations)), key=level.__getitem__):
+        if incoming[node]:
+            es[node] = max(es[p] + durations[p] for p in incoming[node])
+    return es
+
+
+def _backward_python(durations, sources, targets, level, finish):
+    outgoing = [[] for _ in durations]
+    for source, target in zip(sources, targets):
+        outgoing[source].append(target)
+
+    lf = [finish] * len(durations)
+    for node in sorted(range(len(durations)), key=level.__getitem__, reverse=True):
+        if outgoing[node]:
+            lf[node] = min(lf[s] - durations[s] for s in outgoing[node])
+    return lf
+
+
+def forward_pass(durations, sources, targets):
+    """
+    Earliest start of every node, in days from the start, given node
+    durations and (prerequisite, dependent) edges as parallel position lists.
+    Returns None if the edges contain a cycle.
+    """
+    offsets, sorted_targets = _csr(len(durations), sources, targets)
+    level = _levels(len(durations), offsets, sorted_targets)
+    if level is None:
+        return None
+    forward = _forward_numpy if np is not None else _forward_python
+    return forward(durations, sources, targets, level)
+
+
+def critical_path(graph, task_map):
+    """
+    Critical path method over a scheduler dependency graph.
+
+    graph and task_map are the first and last values returned by
+    GlobalParallelScheduler._build_dependency_graph: graph maps a task id to
+    the ids that depend on it, task_map maps ids to rows with duration_days.
+    Times are whole days from the project start; resources are not
+    considered. Uses NumPy array passes when it is installed.
+
+    Raises ValueError listing every cycle if the graph is not acyclic.
+    """
+    task_ids = list(task_map)
+    index = {task_id: pos for pos, task_id in enumerate(task_ids)}
+    durations = [task_map[task_id].duration_days for task_id in task_ids]
+
+    sources, targets = [], []
+    for depends_on_id, dependents in graph.items():
+        if depends_on_id not in index:
+            continue
+        for task_id in dependents:
+            if task_id in index:
+                sources.append(index[depends_on_id])
+                targets.append(index[task_id])
+
+    offsets, sorted_targets = _csr(len(task_ids), sources, targets)
+    level = _levels(len(task_ids), offsets, sorted_targets)
+    if level is None:
+        cycles = find_cycles(task_ids, lambda node: graph.get(node, []))
+        groups = '; '.join(', '.join(str(task_id) for task_id in cycle) for cycle in cycles)
+        raise ValueError(f"Circular dependencies detected between tasks: {groups}")
+
+    forward, backward = (
+        (_forward_numpy, _backward_numpy) if np is not None else (_forward_python, _backward_python)
+    )
+    es = forward(durations, sources, targets, level)
+    ef = [start + duration for start, duration in zip(es, durations)]
+    finish = max(ef, default=0)
+    lf = backward(durations, sources, targets, level, finish)
+    ls = [finish_day - duration for finish_day, duration in zip(lf, durations)]
+    slack = [late - early for early, late in zip(es, ls)]
+
+    # Walk back from a critical task that ends the project, through critical
+    # prerequisites that finish exactly when their dependent starts
+    predecessors = {}
+    for source, target in zip(sources, targets):
+        predecessors.setdefault(target, []).append(source)
+    chain = []
+    current = next(
+        (node for node in range(len(task_ids)) if slack[node] == 0 and ef[node] == finish),
+        None
+    )
+    while current is not None:
+        chain.append(task_ids[current])
+        current = next(
+            (p for p in predecessors.get(current, ()) if slack[p] == 0 and ef[p] == es[current]),
+            None
+        )
+    chain.reverse()
+
+    return CriticalPath(task_ids, es, ef, ls, lf, slack, chain, finish)
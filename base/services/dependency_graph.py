@@ -0,0 +1,342 @@
+from array import array
+from collections import OrderedDict
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+
+
+DEFAULT_CACHE_SIZE = 512
+
+
+def _build_csr(size, pairs):
+    """Pack (source, target) position pairs into CSR offsets/targets arrays"""
+    counts = [0] * (size + 1)
+    for source, _ in pairs:
+        counts[source + 1] += 1
+    for i in range(size):
+        counts[i + 1] += counts[i]
+
+    offsets = array('l', counts)
+    targets = array('l', [0]) * len(pairs)
+    cursor = counts[:-1]
+    for source, target in pairs:
+        targets[cursor[source]] = target
+        cursor[source] += 1
+    return offsets, targets
+
+
+class ProjectGraph:
+    """
+    Read-only snapshot of one project's dependency graph.
+
+    Task ids live in a sorted integer array and edges are kept as two CSR
+    adjacency structures over array positions:
+    - prerequisites: task -> tasks it depends on
+    - dependents: task -> tasks that depend on it
+    Edges whose endpoints are not both in the project are left out.
+    durations ({task_id: days}, optional) enables earliest_offsets(), whose
+    result is memoized on the snapshot. version is the data version
+    (ScheduleVersion.data_version) the snapshot was loaded at.
+    """
+    __slots__ = (
+        'project_id', 'version', 'task_ids', 'index', 'durations',
+        'prereq_offsets', 'prereq_targets',
+        'dependent_offsets', 'dependent_targets',
+        '_earliest',
+    )
+
+    def __init__(self, project_id, task_ids, edges, durations=None, version=None):
+        self.project_id = project_id
+        self.version = version
+        self.task_ids = array('q', sorted(task_ids))
+        self.index = {task_id: pos for pos, task_id in enumerate(self.task_ids)}
+        self.durations = (
+            array('l', (durations[task_id] for task_id in self.task_ids))
+            if durations is not None else None
+        )
+        self._earliest = None
+
+        pairs = [
+            (self.index[task_id], self.index[depends_on_id])
+            for task_id, depends_on_id in edges
+            if task_id in self.index and depends_on_id in self.index
+        ]
+        size = len(self.task_ids)
+        self.prereq_offsets, self.prereq_targets = _build_csr(size, pairs)
+        self.dependent_offsets, self.dependent_targets = _build_csr(
+            size, [(target, source) for source, target in pairs]
+        )
+
+    def __contains__(self, task_id):
+        return task_id in self.index
+
+    def __len__(self):
+        return len(self.task_ids)
+
+    def _neighbours(self, offsets, targets, task_id):
+        pos = self.index.get(task_id)
+        if pos is None:
+            return []
+        return [self.task_ids[p] for p in targets[offsets[pos]:offsets[pos + 1]]]
+
+    def prerequisites(self, task_id):
+        """Ids of the tasks task_id depends on"""
+        return self._neighbours(self.prereq_offsets, self.prereq_targets, task_id)
+
+    def dependents(self, task_id):
+        """Ids of the tasks that depend on task_id"""
+        return self._neighbours(self.dependent_offsets, self.dependent_targets, task_id)
+
+    def edge_count(self):
+        return len(self.prereq_targets)
+
+    def cycles(self):
+        """Every group of tasks that depend on each other in a loop"""
+        return find_cycles(self.task_ids, self.dependents)
+
+    def earliest_offsets(self, task_id):
+        """
+        (start, end) of task_id in days from the project start, from its
+        dependency ancestry alone (people's availability is ignored).
+        The forward pass runs once per snapshot for the whole project, so
+        through DependencyGraphCache it is memoized per data version.
+        Raises ValueError if the project's dependencies contain a cycle.
+        """
+        if self._earliest is None:
+            # critical_path imports find_cycles from this module
+            from base.services.critical_path import forward_pass
+
+            sources = array('l')
+            targets = array('l')
+            for pos in range(len(self.task_ids)):
+                for prerequisite in self.prereq_targets[self.prereq_offsets[pos]:self.prereq_offsets[pos + 1]]:
+                    sources.append(prerequisite)
+                    targets.append(pos)
+            earliest = forward_pass(self.durations, sources, targets)
+            if earliest is None:
+                groups = '; '.join(
+                    ', '.join(str(member) for member in cycle) for cycle in self.cycles()
+                )
+                raise ValueError(f"Circular dependencies detected between tasks: {groups}")
+            self._earliest = earliest
+
+        pos = self.index[task_id]
+        start = self._earliest[pos]
+        return start, start + self.durations[pos]
+
+
+def find_cycles(nodes, successors):
+    """
+    Iterative Tarjan strongly-connected-components pass, O(V+E).
+
+    nodes is an iterable of node ids and successors(node) returns the nodes it
+    points to. Returns every cyclic group (components with more than one node,
+    or a node pointing at itself) as sorted id lists, so all cycles can be
+    reported at once. Uses an explicit stack, so chain length is not limited
+    by the recursion limit.
+    """
+    index = {}
+    lowlink = {}
+    on_stack = set()
+    stack = []
+    cycles = []
+    counter = 0
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+
+        while work:
+            node, neighbours = work[-1]
+            for neighbour in neighbours:
+                if neighbour not in index:
+                    index[neighbour] = lowlink[neighbour] = counter
+                    counter += 1
+                    stack.append(neighbour)
+                    on_stack.add(neighbour)
+                    work.append((neighbour, iter(successors(neighbour))))
+                    break
+                if neighbour in on_stack:
+                    lowlink[node] = min(lowlink[node], index[neighbour])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in successors(node):
+                        cycles.append(sorted(component))
+
+    return cycles
+
+
+class DependencyGraphCache:
+    """
+    Process-local LRU cache of ProjectGraph snapshots keyed by project id.
+
+    Graphs are loaded with two queries on a miss. Each snapshot is stamped
+    with the data version stored in the database, which every write bumps
+    in its own transaction, so a snapshot is reloaded as soon as any
+    process has changed the data since it was taken. The signal handlers
+    in base.signals also drop this process's snapshots right away when a
+    task joins or leaves a project, a task's duration changes, or a
+    dependency of the project changes. The number of cached projects is
+    bounded by the DEPENDENCY_GRAPH_CACHE_SIZE setting.
+    """
+    def __init__(self, max_projects=None):
+        self._max_projects = max_projects
+        self._graphs = OrderedDict()
+        self._task_projects = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_projects(self):
+        if self._max_projects is not None:
+            return self._max_projects
+        return getattr(settings, 'DEPENDENCY_GRAPH_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+
+    def get(self, project_id):
+        """
+        Return the graph for project_id, loading it on a cache miss or when
+        the data version has moved since the cached snapshot was loaded
+        """
+        # schedule_cache imports the scheduler, which imports this module
+        from base.services.schedule_cache import current_version
+
+        version = current_version()
+        with self._lock:
+            graph = self._graphs.get(project_id)
+            if graph is not None and graph.version == version:
+                self._graphs.move_to_end(project_id)
+                return graph
+            epoch = self._epoch
+
+        graph = self._load(project_id, version)
+
+        with self._lock:
+            # Only keep the snapshot if nothing was invalidated while loading it
+            if epoch == self._epoch:
+                self._store(graph)
+        return graph
+
+    def _load(self, project_id, version=None):
+        return load_project_graph(project_id, version)
+
+    def _store(self, graph):
+        self._discard(graph.project_id)
+        self._graphs[graph.project_id] = graph
+        for task_id in graph.task_ids:
+            self._task_projects[task_id] = graph.project_id
+        while len(self._graphs) > max(self.max_projects, 0):
+            oldest = next(iter(self._graphs))
+            self._discard(oldest)
+
+    def _discard(self, project_id):
+        graph = self._graphs.pop(project_id, None)
+        if graph is not None:
+            for task_id in graph.task_ids:
+                self._task_projects.pop(task_id, None)
+
+    def peek(self, project_id):
+        """Return the cached graph for project_id without loading it"""
+        with self._lock:
+            return self._graphs.get(project_id)
+
+    def invalidate(self, *project_ids):
+        with self._lock:
+            self._epoch += 1
+            for project_id in project_ids:
+                self._discard(project_id)
+
+    def invalidate_task(self, task_id):
+        """Drop the cached graph containing task_id, if any"""
+        with self._lock:
+            self._epoch += 1
+            project_id = self._task_projects.get(task_id, _MISSING)
+            if project_id is not _MISSING:
+                self._discard(project_id)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._graphs.clear()
+            self._task_projects.clear()
+
+
+_MISSING = object()
+
+
+def load_project_graph(project_id, version=None):
+    """Build one project's ProjectGraph from the database with two queries"""
+    Task = apps.get_model('base', 'Task')
+    TaskDependency = apps.get_model('base', 'TaskDependency')
+
+    durations = dict(
+        Task.objects.filter(project_id=project_id).values_list('id', 'duration_days')
+    )
+    edges = TaskDependency.objects.filter(task__project_id=project_id).values_list(
+        'task_id', 'depends_on_id'
+    )
+    return ProjectGraph(project_id, list(durations), list(edges), durations, version)
+
+dependency_graphs = DependencyGraphCache()
+
+
+def invalidate_on_commit(callback, *args):
+    """Invalidate now and again once the surrounding transaction commits"""
+    callback(*args)
+    transaction.on_commit(lambda: callback(*args))
+
+
+def dependency_path_exists(source_id, target_id):
+    """
+    Whether target_id is reachable from source_id by following depends_on
+    edges, answered by a single recursive CTE (SQLite and PostgreSQL).
+    UNION rather than UNION ALL keeps the walk finite on cyclic data.
+    """
+    TaskDependency = apps.get_model('base', 'TaskDependency')
+    quote = connection.ops.quote_name
+    table = quote(TaskDependency._meta.db_table)
+    task_col = quote(TaskDependency._meta.get_field('task').column)
+    depends_on_col = quote(TaskDependency._meta.get_field('depends_on').column)
+
+    sql = f"""
+        WITH RECURSIVE reachable(task_id) AS (
+            SELECT {depends_on_col} FROM {table} WHERE {task_col} = %s
+            UNION
+            SELECT dep.{depends_on_col}
+            FROM {table} dep
+            JOIN reachable ON dep.{task_col} = reachable.task_id
+        )
+        SELECT 1 FROM reachable WHERE task_id = %s LIMIT 1
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [source_id, target_id])
+        return cursor.fetchone() is not None
+
+
+def creates_circular_dependency(task, depends_on):
+    """
+    Whether adding "task depends on depends_on" would close a loop, i.e.
+    whether depends_on can already reach task. Always asks the database:
+    one recursive query sees edges written earlier in the same transaction
+    and is cheaper than reloading the project's graph after every write.
+    """
+    if task.id == depends_on.id:
+        return True
+    return dependency_path_exists(depends_on.id, task.id)
@@ -0,0 +1,197 @@
+import logging
+
+from django.utils import timezone
+
+from base.services.scheduling import GlobalParallelScheduler
+
+
+logger = logging.getLogger(__name__)
+
+# Above this share of all tasks a repair is no cheaper than a full run
+MAX_REPAIR_FRACTION = 0.5
+
+
+class IncrementalScheduler(GlobalParallelScheduler):
+    """
+    Scheduler that keeps its last result and repairs it after small edits.
+
+    A full run places projects in order, and a project's placements depend
+    only on its own tasks and dependencies and on when each of its owners
+    comes free after the earlier projects. generate_schedule() does a full
+    run and remembers, per project, its inputs, its placements and the
+    owners' availability on entry and exit. reschedule(task_ids) reloads
+    only the projects the touched tasks belong (or belonged) to, then walks
+    the projects in the same order as a full run and re-places a project
+    only when its inputs changed or one of its owners comes free at a
+    different date. Every other project keeps its placements, so the
+    result is exactly what a full run would return, and the work scales
+    with the projects an edit actually moves.
+    """
+    def __init__(self):
+        super().__init__()
+        self.placements = {}                  # task_id -> (start_date, end_date)
+        self.rows = {}                        # task_id -> TaskRow
+        self.task_project = {}                # task_id -> project_id
+        self.projects = {}                    # project_id -> (position, ProjectRow, start_date)
+        self.order = []                       # project ids in scheduling order
+        self.project_tasks = {}               # project_id -> [TaskRow] in snapshot order
+        self.project_edges = {}               # project_id -> [(task_id, depends_on_id)]
+        self.project_placements = {}          # project_id -> [(start_date, end_date, TaskRow)]
+        self.entry_availability = {}          # project_id -> {owner_id: date or None} before the project
+        self.exit_availability = {}           # project_id -> {owner_id: date} after the project
+        self.replaced = None                  # task ids re-placed by the last reschedule, None after a full run
+
+    def _place_all(self, project_ids=None):
+        placed = super()._place_all(project_ids)
+        self.replaced = None
+
+        self.projects.clear()
+        self.project_tasks.clear()
+        self.project_edges.clear()
+        self.project_placements.clear()
+        self.entry_availability.clear()
+        self.exit_availability.clear()
+        self.order = [project.id for project in self.snapshot.projects]
+        for position, project in enumerate(self.snapshot.projects):
+            self.projects[project.id] = (position, project, self._project_start(project))
+            self.project_tasks[project.id] = self.snapshot.tasks.get(project.id, [])
+            self.project_edges[project.id] = self.snapshot.edges.get(project.id, [])
+
+        # Owners' availability only ever moves forward, so it can be rebuilt
+        # from the placements (this also covers runs placed in worker processes)
+        availability = {}
+        for project, placements in placed:
+            self._record(project.id, placements, availability)
+        self._index()
+        return placed
+
+    def _project_start(self, project):
+        return project.start_date if project.start_date else timezone.now().date()
+
+    def _record(self, project_id, placements, availability):
+        """Store a project's placements and move availability past them"""
+        owners = {task.owner_id for task in self.project_tasks[project_id] if task.owner_id is not None}
+        self.entry_availability[project_id] = {owner: availability.get(owner) for owner in owners}
+        for _, end_date, task in placements:
+            if task.owner_id is not None:
+                availability[task.owner_id] = end_date
+        self.exit_availability[project_id] = {owner: availability[owner] for owner in owners}
+        self.project_placements[project_id] = placements
+
+    def _index(self):
+        self.placements.clear()
+        self.rows.clear()
+        self.task_project.clear()
+        for project_id in self.order:
+            for start_date, end_date, task in self.project_placements[project_id]:
+                self.placements[task.id] = (start_date, end_date)
+                self.rows[task.id] = task
+                self.task_project[task.id] = project_id
+
+    def _effective(self, project_id, free):
+        """When an owner who is free at `free` can start work in the project"""
+        start = self.projects[project_id][2]
+        return start if free is None else max(start, free)
+
+    def reschedule(self, task_ids):
+        """
+        Repair the last schedule after the given tasks (or their dependencies)
+        changed. Returns the new result, or None when the edit cannot be
+        repaired (a project this run has never seen) or would touch so much
+        that a full run is cheaper.
+        """
+        if self.snapshot is None:
+            return None
+
+        task_ids = set(task_ids)
+        Task = self._get_task_model()
+        current = dict(Task.objects.filter(id__in=task_ids).values_list('id', 'project_id'))
+
+        if any(current.get(task_id, True) is None for task_id in self.task_project.keys() & task_ids):
+            return None  # left its project: its stored entry has to go, which needs a full write
+
+        reloaded = {self.task_project[task_id] for task_id in task_ids if task_id in self.task_project}
+        reloaded.update(project_id for project_id in current.values() if project_id is not None)
+        if any(project_id not in self.projects for project_id in reloaded):
+            return None
+        if not reloaded:
+            self.replaced = set()
+            return self._result()
+
+        snapshot = self._load_snapshot(reloaded)
+        if {project.id for project in snapshot.projects} != reloaded:
+            return None
+
+        total = max(sum(len(tasks) for tasks in self.project_tasks.values()), 1)
+        budget = MAX_REPAIR_FRACTION * total
+
+        # Walk the projects in scheduling order with the running availability,
+        # re-placing only the ones whose inputs differ from the last run
+        availability = {}
+        changes = {}
+        replaced = set()
+        for project_id in self.order:
+            tasks = self.project_tasks[project_id]
+            edges = self.project_edges[project_id]
+            if project_id in reloaded:
+                tasks = snapshot.tasks.get(project_id, [])
+                edges = snapshot.edges.get(project_id, [])
+
+            owners = {task.owner_id for task in tasks if task.owner_id is not None}
+            entry = {owner: availability.get(owner) for owner in owners}
+            if not self._needs_placing(project_id, tasks, edges, entry):
+                placements = self.project_placements[project_id]
+                if project_id in reloaded:
+                    # Same placement, but titles or owner names may have changed
+                    rows = {task.id: task for task in tasks}
+                    placements = [(start, end, rows[task.id]) for start, end, task in placements]
+                    changes[project_id] = (tasks, edges, placements)
+                availability.update(self.exit_availability[project_id])
+                continue
+
+            replaced.update(task.id for task in tasks)
+            if len(replaced) > budget:
+                return None
+            self.user_availability = {owner: free for owner, free in entry.items() if free is not None}
+            placements = self._place_project(self.projects[project_id][2], tasks, edges)
+            changes[project_id] = (tasks, edges, placements)
+            for _, end_date, task in placements:
+                if task.owner_id is not None:
+                    availability[task.owner_id] = end_date
+
+        # Commit: the walk above raised before touching any state if a project could not be placed
+        availability = {}
+        for project_id in self.order:
+            if project_id in changes:
+                tasks, edges, placements = changes[project_id]
+                self.project_tasks[project_id] = tasks
+                self.project_edges[project_id] = edges
+                self._record(project_id, placements, availability)
+            else:
+                availability.update(self.exit_availability[project_id])
+        self._index()
+        self.replaced = replaced
+        return self._result()
+
+    def _needs_placing(self, project_id, tasks, edges, entry):
+        """Whether placing the project with these inputs could differ from its last placement"""
+        previous = self.project_tasks[project_id]
+        if [(task.id, task.owner_id, task.duration_days) for task in tasks] != [
+            (task.id, task.owner_id, task.duration_days) for task in previous
+        ]:
+            return True
+        if edges != self.project_edges[project_id]:
+            return True
+        stored = self.entry_availability[project_id]
+        return any(
+            self._effective(project_id, free) != self._effective(project_id, stored.get(owner))
+            for owner, free in entry.items()
+        )
+
+    def _result(self):
+        self.schedule = [
+            self._make_entry(self.projects[project_id][1], start_date, end_date, task)
+            for project_id in self.order
+            for start_date, end_date, task in self.project_placements[project_id]
+        ]
+        return self._build_result(self.schedule) if self.projects else {'schedule': []}
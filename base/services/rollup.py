@@ -0,0 +1,91 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from base.services.counters import record_task_changes
+
+
+def _get_task_model():
+    return apps.get_model('base', 'Task')
+
+
+def rollup_completion(parent_ids):
+    """
+    Recompute completed/completed_at for the given parent tasks and their ancestors.
+
+    Same rule as Task.update_completion_status: a task with subtasks is complete
+    exactly when all of its subtasks are. Propagation stops at the first ancestor
+    whose state does not change. The whole chain is read with two queries and
+    written with at most two bulk UPDATEs inside one transaction, together
+    with the completion counters of the flipped tasks' ancestors and projects.
+
+    Returns (completed_ids, reopened_ids) for the tasks whose state flipped.
+    """
+    Task = _get_task_model()
+    parent_ids = {pk for pk in parent_ids if pk is not None}
+    if not parent_ids:
+        return set(), set()
+
+    with transaction.atomic():
+        # The parents plus every task above them, in one closure-table query
+        chain = {}
+        placement = {}
+        for pk, parent_id, completed, project_id, is_private in Task.objects.filter(
+            descendant_links__descendant_id__in=parent_ids
+        ).values_list('id', 'parent_task_id', 'completed', 'project_id', 'is_private').distinct():
+            chain[pk] = (parent_id, completed)
+            placement[pk] = (project_id, is_private)
+
+        incomplete = {}
+        for row in Task.objects.filter(parent_task_id__in=chain).values(
+            'parent_task_id'
+        ).annotate(
+            pending=Count('id', filter=Q(completed=False))
+        ).order_by():
+            incomplete[row['parent_task_id']] = row['pending']
+
+        depths = {}
+        for pk in chain:
+            path = []
+            node = pk
+            while node is not None and node not in depths:
+                path.append(node)
+                node = chain[node][0]
+            depth = depths.get(node, -1)
+            for node in reversed(path):
+                depth += 1
+                depths[node] = depth
+
+        completed_ids, reopened_ids = set(), set()
+        dirty = set(parent_ids)
+        for pk in sorted(chain, key=depths.get, reverse=True):
+            if pk not in dirty or pk not in incomplete:
+                continue
+            parent_id, was_completed = chain[pk]
+            all_complete = incomplete[pk] == 0
+            if all_complete == was_completed:
+                continue
+
+            (completed_ids if all_complete else reopened_ids).add(pk)
+            if parent_id in chain:
+                # The parent's stored counts still see this task's old state
+                incomplete[parent_id] += -1 if all_complete else 1
+                dirty.add(parent_id)
+
+        if completed_ids:
+            Task.objects.filter(id__in=completed_ids).update(
+                completed=True,
+                completed_at=timezone.now()
+            )
+        if reopened_ids:
+            Task.objects.filter(id__in=reopened_ids).update(
+                completed=False,
+                completed_at=None
+            )
+        record_task_changes(
+            (pk, (*placement[pk], pk not in completed_ids), (*placement[pk], pk in completed_ids))
+            for pk in completed_ids | reopened_ids
+        )
+
+    return completed_ids, reopened_ids
@@ -0,0 +1,222 @@
+from concurrent.futures.process import BrokenProcessPool
+import logging
+
+from django.utils import timezone
+
+from base.services.scheduling import (
+    GlobalParallelScheduler, ScheduleSnapshot, discard_worker_pool, get_worker_pool, worker_count
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def apply_overrides(snapshot, scenario, usernames):
+    """
+    Return a copy of snapshot with one scenario's overrides applied.
+    Only the projects a scenario touches get new task and edge lists;
+    everything else is shared with the original snapshot.
+
+    scenario keys (all optional):
+    - owner_changes: [{'task': id, 'owner': user id or None}]
+    - duration_changes: [{'task': id, 'duration_days': days}]
+    - add_dependencies / remove_dependencies: [{'task': id, 'depends_on': id}]
+    usernames maps the user ids used in owner_changes to usernames.
+    """
+    owners = {change['task']: change['owner'] for change in scenario.get('owner_changes', ())}
+    durations = {
+        change['task']: change['duration_days'] for change in scenario.get('duration_changes', ())
+    }
+    added = {(dep['task'], dep['depends_on']) for dep in scenario.get('add_dependencies', ())}
+    removed = {(dep['task'], dep['depends_on']) for dep in scenario.get('remove_dependencies', ())}
+
+    task_project = {
+        task.id: project_id
+        for project_id, tasks in snapshot.tasks.items()
+        for task in tasks
+    }
+
+    tasks = dict(snapshot.tasks)
+    for project_id in {task_project[task_id] for task_id in set(owners) | set(durations)}:
+        rows = []
+        for task in snapshot.tasks[project_id]:
+            if task.id in owners:
+                owner_id = owners[task.id]
+                task = task._replace(owner_id=owner_id, assignee=usernames.get(owner_id))
+            if task.id in durations:
+                task = task._replace(duration_days=durations[task.id])
+            rows.append(task)
+        tasks[project_id] = rows
+
+    edges = dict(snapshot.edges)
+    for project_id in {task_project[task_id] for task_id, _ in added | removed}:
+        current = [edge for edge in snapshot.edges.get(project_id, []) if edge not in removed]
+        present = set(current)
+        current.extend(
+            edge for edge in sorted(added)
+            if task_project[edge[0]] == project_id and edge not in present
+        )
+        edges[project_id] = current
+
+    return ScheduleSnapshot(snapshot.projects, tasks, edges)
+
+
+def evaluate(snapshot, scenario, usernames, today):
+    """
+    Place every project of snapshot with the scenario applied and summarize:
+    overall start, end and makespan, plus each project's end date.
+    """
+    if scenario:
+        snapshot = apply_overrides(snapshot, scenario, usernames)
+
+    scheduler = GlobalParallelScheduler()
+    try:
+        placed = scheduler._place_sequential([
+            (
+                project,
+                project.start_date if project.start_date else today,
+                snapshot.tasks.get(project.id, []),
+                snapshot.edges.get(project.id, [])
+            )
+            for project in snapshot.projects
+        ])
+    except ValueError as e:
+        return {'error': str(e)}
+
+    projects = {}
+    starts, ends = [], []
+    for project, placements in placed:
+        end_date = max((end for _, end, _ in placements), default=None)
+        projects[project.id] = end_date
+        starts.extend(start for start, _, _ in placements)
+        if end_date is not None:
+            ends.append(end_date)
+
+    start_date = min(starts, default=None)
+    end_date = max(ends, default=None)
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'makespan_days': (end_date - start_date).days if starts else 0,
+        'projects': projects
+    }
+
+
+def _evaluate_batch(snapshot, runs, usernames, today):
+    """Worker entry point: evaluate several runs against one snapshot"""
+    return [evaluate(snapshot, run, usernames, today) for run in runs]
+
+
+def _evaluate_all(snapshot, scenarios, usernames, today):
+    """
+    Evaluate the baseline and every scenario. With more than one worker
+    the runs are split into one batch per worker of the shared scheduler
+    pool, so the snapshot is pickled once per batch and otherwise only the
+    (small) scenarios and summaries cross process boundaries.
+    """
+    runs = [None] + list(scenarios)
+    workers = worker_count()
+    batches = min(workers, len(runs))
+    if batches > 1:
+        pool = get_worker_pool(workers)
+        try:
+            futures = [
+                pool.submit(_evaluate_batch, snapshot, runs[i::batches], usernames, today)
+                for i in range(batches)
+            ]
+            results = [None] * len(runs)
+            for i, future in enumerate(futures):
+                results[i::batches] = future.result()
+            return results
+        except BrokenProcessPool:
+            discard_worker_pool(pool)
+            logger.warning("Scenario worker pool failed, evaluating scenarios in-process")
+    return [evaluate(snapshot, run, usernames, today) for run in runs]
+
+
+def validate_scenarios(snapshot, scenarios):
+    """
+    Check every task referenced by the scenarios is scheduled and that
+    added dependencies stay within one project (the scheduler ignores
+    cross-project edges). Raises ValueError describing the first problem.
+    """
+    task_project = {
+        task.id: project_id
+        for project_id, tasks in snapshot.tasks.items()
+        for task in tasks
+    }
+    for position, scenario in enumerate(scenarios):
+        label = scenario.get('name') or f"#{position + 1}"
+        referenced = [
+            change['task']
+            for key in ('owner_changes', 'duration_changes')
+            for change in scenario.get(key, ())
+        ]
+        for key in ('add_dependencies', 'remove_dependencies'):
+            for dep in scenario.get(key, ()):
+                referenced.extend((dep['task'], dep['depends_on']))
+        missing = sorted({task_id for task_id in referenced if task_id not in task_project})
+        if missing:
+            raise ValueError(
+                f"Scenario {label}: tasks not in any project: {', '.join(map(str, missing))}"
+            )
+        for dep in scenario.get('add_dependencies', ()):
+            if dep['task'] == dep['depends_on']:
+                raise ValueError(f"Scenario {label}: a task cannot depend on itself")
+            if task_project[dep['task']] != task_project[dep['depends_on']]:
+                raise ValueError(
+                    f"Scenario {label}: dependency {dep['task']} -> {dep['depends_on']} crosses projects"
+                )
+
+
+def compare_scenarios(scenarios, usernames):
+    """
+    Evaluate scenarios against one snapshot of the current data.
+    Returns the baseline summary and, per scenario, its summary with
+    makespan and per-project end-date differences from the baseline.
+    """
+    snapshot = GlobalParallelScheduler()._load_snapshot()
+    validate_scenarios(snapshot, scenarios)
+    baseline, *outcomes = _evaluate_all(snapshot, scenarios, usernames, timezone.now().date())
+    if 'error' in baseline:
+        raise ValueError(baseline['error'])
+
+    titles = {project.id: project.title for project in snapshot.projects}
+
+    def project_rows(summary, compare):
+        rows = []
+        for project_id, end_date in summary['projects'].items():
+            base_end = baseline['projects'].get(project_id)
+            row = {'project_id': project_id, 'project_title': titles[project_id], 'end_date': end_date}
+            if compare:
+                row['baseline_end_date'] = base_end
+                row['delta_days'] = (
+                    (end_date - base_end).days if end_date is not None and base_end is not None else None
+                )
+            rows.append(row)
+        return rows
+
+    results = []
+    for position, (scenario, outcome) in enumerate(zip(scenarios, outcomes)):
+        entry = {'name': scenario.get('name') or f"Scenario {position + 1}"}
+        if 'error' in outcome:
+            entry['error'] = outcome['error']
+        else:
+            entry.update(
+                start_date=outcome['start_date'],
+                end_date=outcome['end_date'],
+                makespan_days=outcome['makespan_days'],
+                makespan_delta_days=outcome['makespan_days'] - baseline['makespan_days'],
+                projects=project_rows(outcome, compare=True)
+            )
+        results.append(entry)
+
+    return {
+        'baseline': {
+            'start_date': baseline['start_date'],
+            'end_date': baseline['end_date'],
+            'makespan_days': baseline['makespan_days'],
+            'projects': project_rows(baseline, compare=False)
+        },
+        'scenarios': results
+    }
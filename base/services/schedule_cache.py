@@ -0,0 +1,249 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils.http import quote_etag
+
+from base.services.incremental_scheduling import IncrementalScheduler
+from base.services.schedule_store import store_schedule
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_ROW = 1
+CHANGE_LOG_SIZE = 10000
+
+# version -> ids of the tasks its write touched, or None for "reschedule everything"
+_change_log = OrderedDict()
+_change_log_lock = threading.Lock()
+
+
+def _version_row():
+    """The ScheduleVersion row, created (seeded from the clock) if it is missing"""
+    ScheduleVersion = apps.get_model('base', 'ScheduleVersion')
+    row, _ = ScheduleVersion.objects.get_or_create(
+        pk=VERSION_ROW,
+        defaults={'data_version': int(time.time() * 1000)}
+    )
+    return row
+
+
+def current_version():
+    """
+    Version of the data the schedule is computed from.
+    Kept in the ScheduleVersion row so every process agrees on it.
+    """
+    ScheduleVersion = apps.get_model('base', 'ScheduleVersion')
+    version = ScheduleVersion.objects.filter(pk=VERSION_ROW).values_list(
+        'data_version', flat=True
+    ).first()
+    if version is None:
+        version = _version_row().data_version
+    return version
+
+
+def bump_version(task_ids=None):
+    """
+    Move to a new data version inside the current transaction, so the new
+    version becomes visible to other processes together with the write.
+    Which tasks the write touched (None when the whole schedule has to be
+    recomputed) is logged for this process once the transaction commits.
+
+    The version row stays locked until the transaction ends, so concurrent
+    writers take turns on it; callers that write many tasks at once bump
+    once for all of them (see the task delete receiver in base.signals).
+    """
+    task_ids = None if task_ids is None else frozenset(task_ids)
+    ScheduleVersion = apps.get_model('base', 'ScheduleVersion')
+    with transaction.atomic():
+        if not ScheduleVersion.objects.filter(pk=VERSION_ROW).update(
+            data_version=F('data_version') + 1
+        ):
+            _version_row()
+            ScheduleVersion.objects.filter(pk=VERSION_ROW).update(
+                data_version=F('data_version') + 1
+            )
+        version = ScheduleVersion.objects.filter(pk=VERSION_ROW).values_list(
+            'data_version', flat=True
+        ).get()
+    transaction.on_commit(lambda: _log_change(version, task_ids))
+    return version
+
+
+def _log_change(version, task_ids):
+    with _change_log_lock:
+        _change_log[version] = task_ids
+        while len(_change_log) > CHANGE_LOG_SIZE:
+            _change_log.popitem(last=False)
+
+
+def changes_between(old_version, new_version):
+    """
+    Task ids touched by the writes in (old_version, new_version], or None when
+    this process did not see every one of those writes or one of them needs a
+    full recompute.
+    """
+    if old_version is None or new_version < old_version:
+        return None
+    if new_version - old_version > CHANGE_LOG_SIZE:
+        return None
+
+    task_ids = set()
+    with _change_log_lock:
+        for version in range(old_version + 1, new_version + 1):
+            if version not in _change_log:
+                return None
+            touched = _change_log[version]
+            if touched is None:
+                return None
+            task_ids.update(touched)
+    return task_ids
+
+
+def schedule_etag(version):
+    return quote_etag(f'schedule-{version}')
+
+
+class ScheduleCache:
+    """
+    Process-local cache of the last global schedule, keyed by data version.
+
+    - Requests for the version already cached are served from memory.
+    - Concurrent requests for a version that is not cached share a single
+      in-flight computation (single-flight) instead of each running the scheduler.
+    - With SCHEDULE_STALE_WHILE_REVALIDATE enabled, a request that finds an
+      older result gets it immediately while the new version is computed in a
+      background thread.
+    - When every write since the last computation is in this process's change
+      log, the previous IncrementalScheduler repairs its result instead of
+      running a full schedule.
+    - Every computed version is written to the ScheduleEntry table; after a
+      repair only the re-placed tasks are upserted.
+    """
+    def __init__(self, compute=None):
+        self._custom_compute = compute
+        self._lock = threading.Lock()
+        self._result = None
+        self._version = None
+        self._inflight = {}
+        self._state_lock = threading.Lock()
+        self._scheduler = None
+        self._scheduler_version = None
+
+    def _compute(self, version):
+        if self._custom_compute is not None:
+            return self._custom_compute()
+
+        with self._state_lock:
+            result = None
+            if self._scheduler is not None:
+                changes = changes_between(self._scheduler_version, version)
+                if changes is not None:
+                    try:
+                        result = self._scheduler.reschedule(changes)
+                    except Exception as e:
+                        logger.warning(f"Incremental reschedule failed, running a full schedule: {str(e)}")
+                        result = None
+
+            if result is None:
+                self._scheduler = None
+                scheduler = IncrementalScheduler()
+                result = scheduler.generate_schedule()
+                self._scheduler = scheduler
+
+            repaired_from = self._scheduler_version
+            self._scheduler_version = version
+            self._store(version, repaired_from)
+            return result
+
+    def _store(self, version, repaired_from):
+        """
+        Persist the scheduler's placements. A repair only writes its re-placed
+        tasks when the table already holds the version it was repaired from.
+        """
+        scheduler = self._scheduler
+        try:
+            store_schedule(scheduler, version, scheduler.replaced, base_version=repaired_from)
+        except Exception as e:
+            logger.warning(f"Storing schedule version {version} failed: {str(e)}")
+
+    @property
+    def stale_while_revalidate(self):
+        return getattr(settings, 'SCHEDULE_STALE_WHILE_REVALIDATE', True)
+
+    def peek(self, version):
+        """The cached result if it is for version, else None"""
+        with self._lock:
+            return self._result if self._version == version else None
+
+    def get(self, allow_stale=None):
+        """
+        Return (result, version) for the current data version, computing it at
+        most once per version. May return an older version when stale results
+        are allowed; the version returned always matches the result.
+        """
+        if allow_stale is None:
+            allow_stale = self.stale_while_revalidate
+        version = current_version()
+
+        with self._lock:
+            if self._version == version:
+                return self._result, version
+            future = self._inflight.get(version)
+            leader = future is None
+            if leader:
+                future = self._inflight[version] = Future()
+            stale = (self._result, self._version) if self._result is not None else None
+
+        if stale is not None and allow_stale:
+            if leader:
+                threading.Thread(
+                    target=self._refresh_in_background,
+                    args=(version, future),
+                    daemon=True
+                ).start()
+            return stale
+
+        if leader:
+            self._run(version, future)
+        return future.result(), version
+
+    def _run(self, version, future):
+        try:
+            result = self._compute(version)
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            with self._lock:
+                if self._version is None or version > self._version:
+                    self._result, self._version = result, version
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._inflight.pop(version, None)
+
+    def _refresh_in_background(self, version, future):
+        close_old_connections()
+        try:
+            self._run(version, future)
+            if future.exception() is not None:
+                logger.error(f"Background schedule refresh failed: {future.exception()}")
+        finally:
+            connection.close()
+
+    def clear(self):
+        with self._lock:
+            self._result = None
+            self._version = None
+        with self._state_lock:
+            self._scheduler = None
+            self._scheduler_version = None
+
+
+schedule_cache = ScheduleCache()
@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import socket
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from base.services.schedule_cache import current_version
+from base.services.scheduling import GlobalParallelScheduler
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+_swept = False
+_sweep_lock = threading.Lock()
+
+ORPHANED_JOB_ERROR = "The process running this job stopped before it finished"
+
+
+def _get_executor():
+    """
+    Thread pool shared by every job in this process. Its size is the
+    concurrency limit: further jobs stay 'pending' until a worker frees up.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, 'SCHEDULE_JOB_WORKERS', DEFAULT_JOB_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='schedule-job')
+        return _executor
+
+
+def current_worker():
+    """Name of this process as recorded on the jobs it queues"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name != 'posix':
+        return True  # no safe liveness probe: leave other processes' jobs alone
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def sweep_orphaned_jobs(force=False):
+    """
+    Mark 'pending' and 'running' jobs whose process is gone as 'failed'.
+
+    Jobs are queued in the thread pool of the process that created them, so
+    a restart or a recycled worker leaves its unfinished rows behind with
+    nothing left to run them. A job is orphaned when it was queued by a
+    process on this host that no longer exists, or recorded no process at
+    all. Jobs of other hosts are left alone. Runs once per process (on the
+    first submit or status poll) unless force is set; returns the number of
+    jobs marked failed.
+    """
+    global _swept
+    with _sweep_lock:
+        if _swept and not force:
+            return 0
+        _swept = True
+
+    ScheduleJob = apps.get_model('base', 'ScheduleJob')
+    host = socket.gethostname()
+    orphaned = []
+    for job_id, worker in ScheduleJob.objects.filter(
+        status__in=['pending', 'running']
+    ).values_list('id', 'worker'):
+        job_host, _, pid = worker.rpartition(':')
+        if not worker or (job_host == host and pid.isdigit() and not _process_alive(int(pid))):
+            orphaned.append(job_id)
+
+    if orphaned:
+        logger.warning(f"Marking {len(orphaned)} orphaned schedule job(s) as failed")
+        ScheduleJob.objects.filter(pk__in=orphaned, status__in=['pending', 'running']).update(
+            status='failed', error=ORPHANED_JOB_ERROR, finished_at=timezone.now()
+        )
+    return len(orphaned)
+
+
+def submit_job(job):
+    """Queue a saved ScheduleJob once the transaction that created it commits"""
+    sweep_orphaned_jobs()
+    ScheduleJob = apps.get_model('base', 'ScheduleJob')
+    job.worker = current_worker()
+    ScheduleJob.objects.filter(pk=job.pk).update(worker=job.worker)
+    transaction.on_commit(lambda: _get_executor().submit(run_job, job.pk))
+
+
+def run_job(job_id):
+    """Run one job on a pool thread and record its outcome"""
+    ScheduleJob = apps.get_model('base', 'ScheduleJob')
+    close_old_connections()
+    try:
+        ScheduleJob.objects.filter(pk=job_id).update(status='running', started_at=timezone.now())
+        job = ScheduleJob.objects.get(pk=job_id)
+
+        scheduler = GlobalParallelScheduler()
+        last_percent = [0]
+
+        def report(done, total):
+            percent = done * 100 // total if total else 100
+            if percent != last_percent[0]:
+                last_percent[0] = percent
+                ScheduleJob.objects.filter(pk=job_id).update(progress=percent)
+
+        scheduler.progress = report
+        version = current_version()
+        try:
+            if job.project_id is None and job.user_id is None:
+                result = scheduler.generate_schedule()
+            else:
+                project_ids = [job.project_id] if job.project_id is not None else None
+                result = scheduler.generate_scoped_schedule(project_ids, job.user_id)
+        except Exception as e:
+            logger.error(f"Schedule job {job_id} failed: {str(e)}")
+            ScheduleJob.objects.filter(pk=job_id).update(
+                status='failed', error=str(e), finished_at=timezone.now()
+            )
+            return
+
+        job.status = 'succeeded'
+        job.progress = 100
+        job.version = version
+        job.result = result
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'progress', 'version', 'result', 'finished_at'])
+    except Exception:
+        logger.exception(f"Schedule job {job_id} could not be recorded")
+    finally:
+        connection.close()
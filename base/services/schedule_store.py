@@ -0,0 +1,91 @@
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Q
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_ROW = 1
+BATCH_SIZE = 1000
+
+
+def stored_version():
+    """Data version the ScheduleEntry table was last written for, or None"""
+    ScheduleVersion = apps.get_model('base', 'ScheduleVersion')
+    return ScheduleVersion.objects.filter(pk=VERSION_ROW).values_list(
+        'stored_version', flat=True
+    ).first()
+
+
+class _Superseded(Exception):
+    """Another process stored a conflicting version while this one was writing"""
+
+
+def store_schedule(scheduler, version, task_ids=None, base_version=None):
+    """
+    Upsert an IncrementalScheduler's placements into ScheduleEntry.
+
+    task_ids limits the write to the tasks that were re-placed by an
+    incremental repair of base_version; it is only used when the table
+    holds exactly that version, otherwise every row is rewritten. A full
+    write drops rows for tasks that are no longer scheduled. Deleted tasks
+    take their rows with them (cascade), so a repair never has to delete.
+    Versions older than the stored one are ignored so a slow computation
+    cannot overwrite a newer one. The stored version is moved with a
+    conditional UPDATE at the end of the write, so when processes race the
+    one that lost rolls back instead of mixing rows of two versions.
+    """
+    ScheduleEntry = apps.get_model('base', 'ScheduleEntry')
+    ScheduleVersion = apps.get_model('base', 'ScheduleVersion')
+
+    ScheduleVersion.objects.get_or_create(pk=VERSION_ROW, defaults={'data_version': version})
+    previous = stored_version()
+    if previous is not None and version < previous:
+        return False
+    if previous is None or previous != base_version:
+        task_ids = None
+
+    if task_ids is None:
+        expected = Q(stored_version__isnull=True) | Q(stored_version__lte=version)
+    else:
+        expected = Q(stored_version=base_version)
+    try:
+        with transaction.atomic():
+            _write_entries(ScheduleEntry, scheduler, version, task_ids)
+            if not ScheduleVersion.objects.filter(expected, pk=VERSION_ROW).update(
+                stored_version=version
+            ):
+                raise _Superseded()
+    except _Superseded:
+        return False
+    return True
+
+
+def _write_entries(ScheduleEntry, scheduler, version, task_ids):
+    full = task_ids is None
+    if full:
+        task_ids = scheduler.placements.keys()
+    entries = [
+        ScheduleEntry(
+            task_id=task_id,
+            user_id=scheduler.rows[task_id].owner_id,
+            project_id=scheduler.task_project[task_id],
+            start_date=scheduler.placements[task_id][0],
+            end_date=scheduler.placements[task_id][1],
+            version=version
+        )
+        for task_id in task_ids
+        if task_id in scheduler.placements
+    ]
+
+    ScheduleEntry.objects.bulk_create(
+        entries,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['task'],
+        update_fields=['user', 'project', 'start_date', 'end_date', 'version']
+    )
+    if full:
+        ScheduleEntry.objects.filter(version__lt=version).delete()
@@ -1,15 +1,135 @@
 from datetime import date, timedelta
-from collections import defaultdict, deque
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import heapq
 import logging
+import multiprocessing
+import os
+import threading
 from typing import Dict, List, Optional
 from django.apps import apps
+from django.conf import settings
+from django.db.models import F
 from django.utils import timezone
 
+from base.services.critical_path import critical_path
+from base.services.dependency_graph import find_cycles
+
 
 
 
 logger = logging.getLogger(__name__)
 
+ProjectRow = namedtuple('ProjectRow', 'id title start_date')
+TaskRow = namedtuple('TaskRow', 'id title owner_id assignee duration_days')
+
+# Below this many tasks, process start-up and pickling cost more than they save
+DEFAULT_PARALLEL_MIN_TASKS = 2000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ScheduleSnapshot:
+    """
+    Plain in-memory copy of everything the scheduler reads.
+
+    - projects: [ProjectRow] in scheduling order
+    - tasks: {project_id: [TaskRow]} in the default task ordering
+    - edges: {project_id: [(task_id, depends_on_id)]}, same-project edges only
+    """
+    def __init__(self, projects, tasks, edges):
+        self.projects = projects
+        self.tasks = tasks
+        self.edges = edges
+
+
+def partition_projects(snapshot):
+    """
+    Split the snapshot's projects into groups that share no task owners.
+    Projects in different groups never compete for a user, so each group can
+    be placed on its own. Groups and the projects inside them keep snapshot order.
+    """
+    parent = {project.id: project.id for project in snapshot.projects}
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    owner_project = {}
+    for project in snapshot.projects:
+        for task in snapshot.tasks.get(project.id, ()):
+            if task.owner_id is None:
+                continue
+            other = owner_project.setdefault(task.owner_id, project.id)
+            root, other_root = find(project.id), find(other)
+            if root != other_root:
+                parent[max(root, other_root)] = min(root, other_root)
+
+    groups = {}
+    for project in snapshot.projects:
+        groups.setdefault(find(project.id), []).append(project)
+    return list(groups.values())
+
+
+def _place_group(jobs):
+    """
+    Worker entry point: place [(project, start_date, tasks, edges)] in order
+    with a fresh scheduler and no database access. Returns one placement
+    list per job as (start_date, end_date, position in tasks), so rows are
+    not pickled a second time.
+    """
+    scheduler = GlobalParallelScheduler()
+    results = []
+    for _, start_date, tasks, edges in jobs:
+        position = {task.id: i for i, task in enumerate(tasks)}
+        results.append([
+            (start, end, position[task.id])
+            for start, end, task in scheduler._place_project(start_date, tasks, edges)
+        ])
+    return results
+
+
+def _worker_context():
+    """
+    Start workers from a clean server process rather than by forking the
+    caller, which may have cache refresh and job threads running.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def worker_count():
+    """Size of the shared worker pool: SCHEDULER_MAX_WORKERS, or one per CPU"""
+    return getattr(settings, 'SCHEDULER_MAX_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_worker_pool(workers):
+    """
+    The process pool shared by everything that places projects in workers
+    (schedules and scenario comparisons), started on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._max_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_worker_context())
+        return _pool
+
+
+def discard_worker_pool(pool):
+    """Drop a broken pool so the next run starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
 class GlobalParallelScheduler:
     """
     A global task scheduler that manages parallel task execution across multiple projects.
@@ -35,6 +155,8 @@ class GlobalParallelScheduler:
         self.user_availability = {}
         self.project_order = {}  
         self.schedule = []
+        self.snapshot = None
+        self.progress = None   # optional callable(projects_placed, project_count)
 
     def _get_task_model(self):
         return apps.get_model('base', 'Task')
@@ -42,7 +164,44 @@ class GlobalParallelScheduler:
     def _get_project_model(self):
         return apps.get_model('base', 'Project')
 
-    def _build_dependency_graph(self, tasks):
+    def _load_snapshot(self, project_ids=None):
+        """
+        Load projects, tasks (with owner names) and dependencies for the whole
+        schedule as values() tuples: three queries however many projects there are.
+        """
+        Project = self._get_project_model()
+        Task = self._get_task_model()
+        TaskDependency = apps.get_model('base', 'TaskDependency')
+
+        # Explicit, total orderings: a scoped reload (see IncrementalScheduler)
+        # must see a project's rows in the same order as a global run
+        projects = Project.objects.order_by('id')
+        tasks = Task.objects.filter(project__isnull=False).order_by('-created_at', '-id')
+        dependencies = TaskDependency.objects.filter(
+            task__project_id=F('depends_on__project_id')
+        ).order_by('id')
+        if project_ids is not None:
+            projects = projects.filter(id__in=project_ids)
+            tasks = tasks.filter(project_id__in=project_ids)
+            dependencies = dependencies.filter(task__project_id__in=project_ids)
+
+        project_rows = [ProjectRow(*row) for row in projects.values_list('id', 'title', 'start_date')]
+
+        task_rows = defaultdict(list)
+        for project_id, *row in tasks.values_list(
+            'project_id', 'id', 'title', 'owner_id', 'owner__username', 'duration_days'
+        ):
+            task_rows[project_id].append(TaskRow(*row))
+
+        edges = defaultdict(list)
+        for project_id, task_id, depends_on_id in dependencies.values_list(
+            'task__project_id', 'task_id', 'depends_on_id'
+        ):
+            edges[project_id].append((task_id, depends_on_id))
+
+        return ScheduleSnapshot(project_rows, task_rows, edges)
+
+    def _build_dependency_graph(self, tasks, edges):
         """Build dependency graph and in-degree count for tasks"""
         graph = defaultdict(list)
         in_degree = defaultdict(int)
@@ -52,152 +211,311 @@ class GlobalParallelScheduler:
             task_map[task.id] = task
             in_degree[task.id] = 0
             
-        for task in tasks:
-            for dep in task.task_dependencies.all():
-                graph[dep.depends_on_id].append(task.id)
-                in_degree[task.id] += 1
+        for task_id, depends_on_id in edges:
+            if task_id in task_map and depends_on_id in task_map:
+                graph[depends_on_id].append(task_id)
+                in_degree[task_id] += 1
         
         return graph, in_degree, task_map
 
     def _check_circular_dependencies(self, graph):
-        """Check for circular dependencies using DFS"""
-        visited = set()
-        path = set()
-        
-        def dfs(node):
-            if node in path:
-                return True
-            if node in visited:
-                return False
-                
-            visited.add(node)
-            path.add(node)
-            
-            for neighbor in graph.get(node, []):
-                if dfs(neighbor):
-                    return True
-                    
-            path.remove(node)
-            return False
-            
-        for node in graph:
-            if dfs(node):
-                raise ValueError(f"Circular dependency detected involving task {node}")
+        """Check for circular dependencies and report every cycle at once"""
+        cycles = find_cycles(list(graph), lambda node: graph.get(node, []))
+        if cycles:
+            groups = '; '.join(
+                ', '.join(str(task_id) for task_id in cycle) for cycle in cycles
+            )
+            raise ValueError(f"Circular dependencies detected between tasks: {groups}")
 
-    def _schedule_project(self, project, project_start_date):
-        """Schedule all tasks for a single project"""
-        Task = self._get_task_model()
-        tasks = Task.objects.filter(project=project).select_related('owner').prefetch_related('task_dependencies')
-        
-        if not tasks.exists():
+    def _schedule_project(self, project, project_start_date, tasks, edges):
+        """Schedule all tasks for a single project from snapshot rows"""
+        return [
+            self._make_entry(project, start_date, end_date, task)
+            for start_date, end_date, task in self._place_project(project_start_date, tasks, edges)
+        ]
+
+    def _make_entry(self, project, start_date, end_date, task):
+        """Build the public schedule dict for one placed task"""
+        return {
+            'id': task.id,
+            'title': task.title,
+            'start_date': start_date,
+            'end_date': end_date,
+            'assignee': task.assignee,
+            'duration_days': task.duration_days,
+            'project_id': project.id,
+            'project_title': project.title
+        }
+
+    def _place_project(self, project_start_date, tasks, edges):
+        """
+        Place a project's tasks and return compact (start_date, end_date, TaskRow)
+        tuples in non-decreasing start order.
+        A task starts once its prerequisites have ended and its owner is free;
+        runs in O((V+E) log V) regardless of task durations.
+        """
+        if not tasks:
             return []
 
         # Build dependency graph
-        graph, in_degree, task_map = self._build_dependency_graph(tasks)
+        graph, in_degree, task_map = self._build_dependency_graph(tasks, edges)
         self._check_circular_dependencies(graph)
         
-        # Initialize scheduling structures
+        # Event-driven placement: time jumps straight to the next moment a
+        # user (lane) is free and has a released task, instead of day by day.
+        # Each lane is an owner, or None for the project's unassigned tasks.
         project_schedule = []
-        queue = deque([tid for tid in in_degree if in_degree[tid] == 0])
-        current_date = project_start_date
-        
-        # Get all unique users in this project
-        users = {task.owner for task in tasks if task.owner}
-        user_queue = deque(users)
-        
-        while queue:
-            # Assign one task to each available user
-            for _ in range(len(user_queue)):
-                if not queue:
-                    break
-                    
-                task_id = queue.popleft()
-                task = task_map[task_id]
-                
-                if task.owner:
-                    # Get user's next available time
-                    start_date = max(
-                        current_date,
-                        self.user_availability.get(task.owner.id, current_date)
-                    )
-                    end_date = start_date + timedelta(days=task.duration_days)
-                    
-                    # Update user availability
-                    self.user_availability[task.owner.id] = end_date
-                    
-                    # Add to schedule
-                    project_schedule.append({
-                        'id': task.id,
-                        'title': task.title,
-                        'start_date': start_date,
-                        'end_date': end_date,
-                        'assignee': task.owner.username,
-                        'duration_days': task.duration_days,
-                        'project_id': project.id,
-                        'project_title': project.title
-                    })
-                    
-                    # Update queue with newly available tasks
-                    for neighbor in graph[task_id]:
-                        in_degree[neighbor] -= 1
-                        if in_degree[neighbor] == 0:
-                            queue.append(neighbor)
-                else:
-                    # Unassigned task - schedule sequentially
-                    start_date = current_date
-                    end_date = start_date + timedelta(days=task.duration_days)
-                    current_date = end_date
-                    
-                    project_schedule.append({
-                        'id': task.id,
-                        'title': task.title,
-                        'start_date': start_date,
-                        'end_date': end_date,
-                        'assignee': None,
-                        'duration_days': task.duration_days,
-                        'project_id': project.id,
-                        'project_title': project.title
-                    })
-                    
-                    # Update queue with newly available tasks
-                    for neighbor in graph[task_id]:
-                        in_degree[neighbor] -= 1
-                        if in_degree[neighbor] == 0:
-                            queue.append(neighbor)
-            
-            # Move to next day if there are still tasks to schedule
-            if queue:
-                current_date += timedelta(days=1)
+        order = {task_id: seq for seq, task_id in enumerate(task_map)}
+        ready_at = {}
+        lane_free = {None: project_start_date}
+        lane_ready = defaultdict(list)   # lane -> heap of (ready_date, seq, task_id)
+        lane_order = {}
+        lane_key = {}
+        events = []                      # heap of (start_date, lane_seq, lane)
+
+        def free_at(lane):
+            if lane is None:
+                return lane_free[None]
+            return max(project_start_date, self.user_availability.get(lane, project_start_date))
+
+        def refresh_lane(lane):
+            if not lane_ready[lane]:
+                lane_key.pop(lane, None)
+                return
+            key = max(free_at(lane), lane_ready[lane][0][0])
+            if lane_key.get(lane) != key:
+                lane_key[lane] = key
+                heapq.heappush(events, (key, lane_order.setdefault(lane, len(lane_order)), lane))
+
+        def release(task_id):
+            lane = task_map[task_id].owner_id
+            ready = ready_at.get(task_id, project_start_date)
+            heapq.heappush(lane_ready[lane], (ready, order[task_id], task_id))
+            refresh_lane(lane)
+
+        for task_id in task_map:
+            if in_degree[task_id] == 0:
+                release(task_id)
+
+        while events:
+            start_date, _, lane = heapq.heappop(events)
+            if lane_key.get(lane) != start_date:
+                continue  # stale entry, the lane was re-keyed since
+            del lane_key[lane]
+
+            _, _, task_id = heapq.heappop(lane_ready[lane])
+            task = task_map[task_id]
+            end_date = start_date + timedelta(days=task.duration_days)
+
+            if lane is None:
+                lane_free[None] = end_date
+            else:
+                self.user_availability[lane] = end_date
+
+            project_schedule.append((start_date, end_date, task))
+
+            # Release dependents once all of their prerequisites are placed
+            for neighbor in graph[task_id]:
+                ready_at[neighbor] = max(ready_at.get(neighbor, project_start_date), end_date)
+                in_degree[neighbor] -= 1
+                if in_degree[neighbor] == 0:
+                    release(neighbor)
+
+            refresh_lane(lane)
                 
         return project_schedule
 
-    def generate_schedule(self):
-        """Generate schedule for all projects ordered by their priority"""
+    def _place_all(self, project_ids=None):
+        """
+        Load the snapshot and place every project (or only project_ids) in
+        priority order. Returns [(project, placements)] with placements as
+        from _place_project.
+        """
+        snapshot = self.snapshot = self._load_snapshot(project_ids)
+
+        # Reset scheduling state
+        self.user_availability = {}
+        today = timezone.now().date()
+        jobs = [
+            (
+                project,
+                project.start_date if project.start_date else today,
+                snapshot.tasks.get(project.id, []),
+                snapshot.edges.get(project.id, [])
+            )
+            for project in snapshot.projects
+        ]
+
+        workers = worker_count()
+        min_tasks = getattr(settings, 'SCHEDULER_PARALLEL_MIN_TASKS', DEFAULT_PARALLEL_MIN_TASKS)
+        if workers > 1 and sum(len(tasks) for _, _, tasks, _ in jobs) >= min_tasks:
+            groups = partition_projects(snapshot)
+            if len(groups) > 1:
+                try:
+                    return self._place_parallel(jobs, groups, workers)
+                except BrokenProcessPool:
+                    logger.warning("Scheduler worker pool failed, placing projects sequentially")
+
+        return self._place_sequential(jobs)
+
+    def _place_sequential(self, jobs):
+        """Place [(project, start_date, tasks, edges)] one after another, sharing user availability"""
+        placed = []
+        for project, project_start, tasks, edges in jobs:
+            placed.append((project, self._place_project(project_start, tasks, edges)))
+            self._report_progress(len(placed), len(jobs))
+        return placed
+
+    def _report_progress(self, done, total):
+        if self.progress is not None:
+            self.progress(done, total)
+
+    def _place_parallel(self, jobs, groups, workers):
+        """
+        Place independent project groups in worker processes.
+        Groups are packed into one batch per worker, largest first, and the
+        results are put back in snapshot order, so the output is identical
+        to a sequential run.
+        """
+        job_of = {job[0].id: job for job in jobs}
+        sizes = [sum(len(job_of[project.id][2]) for project in group) for group in groups]
+
+        batches = [[] for _ in range(min(workers, len(groups)))]
+        loads = [0] * len(batches)
+        for position in sorted(range(len(groups)), key=lambda i: -sizes[i]):
+            lightest = loads.index(min(loads))
+            batches[lightest].extend(job_of[project.id] for project in groups[position])
+            loads[lightest] += sizes[position]
+
+        pool = get_worker_pool(workers)
+        placements = {}
         try:
-            Project = self._get_project_model()
-            
-            # Get all projects ordered by their 'order' field
-            projects = Project.objects.all().order_by('id')
+            futures = [pool.submit(_place_group, batch) for batch in batches if batch]
+            for batch, future in zip((batch for batch in batches if batch), futures):
+                for (project, _, tasks, _), result in zip(batch, future.result()):
+                    placements[project.id] = [(start, end, tasks[i]) for start, end, i in result]
+                self._report_progress(len(placements), len(jobs))
+        except BrokenProcessPool:
+            discard_worker_pool(pool)
+            raise
+        return [(project, placements[project.id]) for project, _, _, _ in jobs]
+
+    def generate_schedule(self, project_ids=None):
+        """
+        Generate schedule for all projects ordered by their priority.
+        project_ids restricts the run to those projects; pass a set closed
+        under shared owners (see related_project_ids) to get the same dates
+        as a global run.
+        """
+        try:
+            placed = self._place_all(project_ids)
             
-            if not projects.exists():
+            if not placed:
                 return {'schedule': []}
             
-            # Reset scheduling state
-            self.user_availability = {}
-            self.schedule = []
-            
-            # Schedule each project sequentially
-            for project in projects:
-                project_start = project.start_date if project.start_date else timezone.now().date()
-                project_schedule = self._schedule_project(project, project_start)
-                self.schedule.extend(project_schedule)
-            
-            return {
-                'schedule': sorted(self.schedule, key=lambda x: x['start_date']),
-                'start_date': min(task['start_date'] for task in self.schedule) if self.schedule else None,
-                'end_date': max(task['end_date'] for task in self.schedule) if self.schedule else None
-            }
+            self.schedule = [
+                self._make_entry(project, start_date, end_date, task)
+                for project, placements in placed
+                for start_date, end_date, task in placements
+            ]
+            return self._build_result(self.schedule)
             
         except Exception as e:
             logger.error(f"Global schedule generation failed: {str(e)}")
             raise ValueError(f"Failed to generate global schedule: {str(e)}")
+
+    def related_project_ids(self, project_ids=None, user_id=None):
+        """
+        Smallest set of projects whose schedule is independent of every other
+        project: the given projects (plus those with tasks owned by user_id),
+        closed over the shared-owner relation. One query per hop.
+        """
+        Task = self._get_task_model()
+        scheduled = Task.objects.filter(project__isnull=False)
+
+        related = set(project_ids or ())
+        if user_id is not None:
+            related.update(
+                scheduled.filter(owner_id=user_id).values_list('project_id', flat=True).distinct()
+            )
+
+        frontier = set(related)
+        while frontier:
+            owners = scheduled.filter(project_id__in=frontier, owner__isnull=False).values('owner_id')
+            frontier = set(
+                scheduled.filter(owner_id__in=owners).exclude(
+                    project_id__in=related
+                ).values_list('project_id', flat=True).distinct()
+            )
+            related |= frontier
+        return sorted(related)
+
+    def generate_scoped_schedule(self, project_ids=None, user_id=None, related=None):
+        """
+        Schedule for the projects related to project_ids / user_id (see
+        related_project_ids; pass related if already known), limited to the
+        tasks user_id owns when given. Only those projects are loaded.
+        """
+        if related is None:
+            related = self.related_project_ids(project_ids, user_id)
+        schedule = self.generate_schedule(related)['schedule'] if related else []
+        if user_id is not None and schedule:
+            owned = {
+                task.id
+                for tasks in self.snapshot.tasks.values()
+                for task in tasks
+                if task.owner_id == user_id
+            }
+            schedule = [entry for entry in schedule if entry['id'] in owned]
+        return {'project_ids': related, **self._build_result(schedule)}
+
+    def _build_result(self, schedule):
+        return {
+            'schedule': sorted(schedule, key=lambda x: x['start_date']),
+            'start_date': min(task['start_date'] for task in schedule) if schedule else None,
+            'end_date': max(task['end_date'] for task in schedule) if schedule else None
+        }
+
+    def analyze_critical_path(self, project_id):
+        """
+        Critical path analysis for one project, ignoring user availability.
+        Returns earliest/latest start and finish dates, slack per task and
+        the critical chain of task ids.
+        """
+        snapshot = self._load_snapshot(project_ids=[project_id])
+        if not snapshot.projects:
+            raise ValueError(f"Project {project_id} does not exist")
+        project = snapshot.projects[0]
+        project_start = project.start_date if project.start_date else timezone.now().date()
+
+        graph, _, task_map = self._build_dependency_graph(
+            snapshot.tasks.get(project.id, []),
+            snapshot.edges.get(project.id, [])
+        )
+        cpm = critical_path(graph, task_map)
+
+        def day(offset):
+            return project_start + timedelta(days=offset)
+
+        return {
+            'project_id': project.id,
+            'project_title': project.title,
+            'start_date': project_start,
+            'end_date': day(cpm.duration),
+            'duration_days': cpm.duration,
+            'critical_path': cpm.chain,
+            'tasks': [
+                {
+                    'id': task_id,
+                    'title': task_map[task_id].title,
+                    'duration_days': task_map[task_id].duration_days,
+                    'earliest_start': day(cpm.earliest_start[i]),
+                    'earliest_finish': day(cpm.earliest_finish[i]),
+                    'latest_start': day(cpm.latest_start[i]),
+                    'latest_finish': day(cpm.latest_finish[i]),
+                    'slack_days': cpm.slack[i],
+                    'critical': cpm.slack[i] == 0
+                }
+                for i, task_id in enumerate(cpm.task_ids)
+            ]
+        }
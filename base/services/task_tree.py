@@ -0,0 +1,41 @@
+from collections import defaultdict
+
+from django.apps import apps
+
+
+def build_task_forest(tasks):
+    """
+    Link a flat collection of tasks into parent/child lists in memory.
+
+    Returns (tasks, children) where tasks is the evaluated list and children
+    maps a parent task id to its direct subtasks, in the order they were fetched.
+    """
+    tasks = list(tasks)
+    children = defaultdict(list)
+
+    for task in tasks:
+        if task.parent_task_id is not None:
+            children[task.parent_task_id].append(task)
+
+    return tasks, children
+
+
+def load_subtrees(tasks, root_ids, depth=None):
+    """
+    Fetch every task below root_ids (down to depth levels, or all of them)
+    from the tasks queryset in one closure-table query and link them with
+    build_task_forest.
+    """
+    links = {'ancestor_links__ancestor_id__in': list(root_ids), 'ancestor_links__depth__gt': 0}
+    if depth is not None:
+        # Same filter() call, so the bound applies to the same closure row
+        links['ancestor_links__depth__lte'] = depth
+    return build_task_forest(tasks.filter(**links))
+
+
+def subtree_ids(root_ids):
+    """Ids of the tasks in the subtrees of root_ids, the roots included, in one query"""
+    TaskClosure = apps.get_model('base', 'TaskClosure')
+    return set(TaskClosure.objects.filter(ancestor_id__in=list(root_ids)).values_list(
+        'descendant_id', flat=True
+    ))
@@ -1,11 +1,102 @@
 # your_app/signals.py
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
 
+from base.models import Project, Task, TaskDependency
+from base.services.counters import (
+    deletion_roots,
+    record_task_changes,
+    remove_subtree_counters,
+    task_state,
+)
+from base.services.dependency_graph import dependency_graphs, invalidate_on_commit
+from base.services.schedule_cache import bump_version
+from base.services.task_tree import subtree_ids
+
 @receiver(post_save, sender=get_user_model())
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     """Automatically creates a DRF token when a new user is created"""
     if created:
-        Token.objects.create(user=instance)
\ No newline at end of file
+        Token.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Task)
+def invalidate_graph_on_task_save(sender, instance, created=False, **kwargs):
+    """
+    Drop cached dependency graphs when a task joins or leaves a project, or
+    its duration changes (graphs memoize earliest start dates)
+    """
+    previous_project_id = getattr(instance, '_loaded_project_id', instance.project_id)
+    previous_duration = getattr(instance, '_loaded_duration_days', instance.duration_days)
+    if created or previous_project_id != instance.project_id:
+        projects = [instance.project_id]
+        if not created:
+            projects.append(previous_project_id)
+        invalidate_on_commit(dependency_graphs.invalidate, *projects)
+    elif previous_duration != instance.duration_days:
+        invalidate_on_commit(dependency_graphs.invalidate, instance.project_id)
+
+
+@receiver(post_delete, sender=Task)
+def invalidate_graph_on_task_delete(sender, instance, **kwargs):
+    invalidate_on_commit(dependency_graphs.invalidate, instance.project_id)
+
+
+@receiver([post_save, post_delete], sender=TaskDependency)
+def invalidate_graph_on_dependency_change(sender, instance, **kwargs):
+    invalidate_on_commit(dependency_graphs.invalidate_task, instance.task_id)
+
+
+@receiver([post_save, post_delete], sender=Project)
+def bump_schedule_version_on_project_change(sender, **kwargs):
+    """Project writes (e.g. start_date) need a full reschedule"""
+    bump_version()
+
+
+@receiver(post_save, sender=Task)
+def bump_schedule_version_on_task_save(sender, instance, **kwargs):
+    """Task writes can be repaired incrementally around the task"""
+    bump_version([instance.id])
+
+
+@receiver(pre_delete, sender=Task)
+def bump_schedule_version_on_task_delete(sender, instance, origin=None, **kwargs):
+    """
+    One version per delete() rather than one per cascaded task: it is taken
+    at the first topmost deleted task, for every task the delete removes
+    """
+    roots = deletion_roots(origin)
+    if roots is None:
+        bump_version([instance.id])
+    elif instance.pk == min(roots):
+        bump_version(subtree_ids(roots))
+
+
+@receiver(post_save, sender=TaskDependency)
+def bump_schedule_version_on_dependency_save(sender, instance, **kwargs):
+    """A dependency change moves the dependent task"""
+    bump_version([instance.task_id])
+
+
+@receiver(post_delete, sender=TaskDependency)
+def bump_schedule_version_on_dependency_delete(sender, instance, origin=None, **kwargs):
+    # Dependencies removed along with a deleted task are covered by its delete's version
+    if deletion_roots(origin) is None:
+        bump_version([instance.task_id])
+
+
+@receiver(pre_delete, sender=Task)
+def update_counters_on_task_delete(sender, instance, origin=None, **kwargs):
+    """
+    Take deleted tasks out of their ancestors' and projects' counters. Sent
+    for every task of a cascading delete while closure rows still exist;
+    each deleted subtree is subtracted once, at its topmost task, and the
+    tasks below it are skipped.
+    """
+    roots = deletion_roots(origin)
+    if roots is None:
+        record_task_changes([(instance.pk, task_state(instance), None)])
+    elif instance.pk in roots:
+        remove_subtree_counters(instance.pk)
@@ -1,13 +1,22 @@
+from datetime import timedelta
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status, viewsets
 from django.contrib.auth import get_user_model
 from django.db import models
+from base.pagination import CreatedAtKeysetPagination
 from base.permissions import IsTaskOwnerOrPublic
-from ..serializers import TaskSerializer,TaskDetailSerializer
+from ..serializers import (
+    TaskSerializer, TaskDetailSerializer, TaskBulkCompletionSerializer,
+    parse_depth, parse_fields, subtask_depth, wants_field
+)
 from rest_framework.decorators import action
-from ..models import Task
+from ..models import Project, Task
+from ..services.completion import evaluate_completion, get_completion_evaluator, set_completion
+from ..services.dependency_graph import dependency_graphs
+from ..services.task_tree import load_subtrees
 
 class TaskViewSet(viewsets.ModelViewSet):
     
@@ -16,13 +25,14 @@ class TaskViewSet(viewsets.ModelViewSet):
     
     Key Features:
     - Full CRUD operations for tasks with hierarchical display
-    - Shows complete task hierarchies by default (3 levels deep)
+    - Shows complete task hierarchies at any depth, assembled in memory
     - Handles task ownership and privacy (private/public)
     - Supports task assignment and dependency checking
     - Provides specialized endpoints for:
       * Viewing nested subtasks
       * Assigning/reassigning owners
       * Getting task timelines
+      * Completing or reopening many tasks in one request
     
     Permissions:
     - Requires authentication
@@ -30,10 +40,13 @@ class TaskViewSet(viewsets.ModelViewSet):
     
     Query Parameters:
     - completed=true/false - Filter tasks by completion status
+    - fields=id,title,subtasks.id - Return only these fields (dotted names select nested fields)
+    - depth=N - Nest at most N levels of subtasks (0 for none)
     """
 
     queryset = Task.objects.all()
     permission_classes = [IsAuthenticated, IsTaskOwnerOrPublic]
+    pagination_class = CreatedAtKeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -44,8 +57,14 @@ class TaskViewSet(viewsets.ModelViewSet):
         context = super().get_serializer_context()
         if self.action == 'retrieve':
             context['hide_parent'] = True
+        context['fields'] = parse_fields(self.request.query_params.get('fields'))
+        context['depth'] = parse_depth(self.request.query_params.get('depth'))
         return context
 
+    def wants_dependencies(self, context):
+        """Only prefetch dependencies when the response renders them"""
+        return wants_field(context, 'dependencies')
+
     def perform_create(self, serializer):
         """Auto-set owner to current user if not provided"""
         if 'owner' not in serializer.validated_data:
@@ -53,44 +72,59 @@ class TaskViewSet(viewsets.ModelViewSet):
         else:
             serializer.save()
     
-    def get_queryset(self):
-        queryset = super().get_queryset()
+    def get_visible_tasks(self):
+        """Tasks the current user may see: public ones and their own private ones"""
         user = self.request.user
-        
-        # Show private tasks only to their owner
-        queryset = queryset.filter(
+        return super().get_queryset().filter(
             models.Q(is_private=False) | 
             models.Q(owner=user)
         )
+
+    def get_queryset(self):
+        queryset = self.get_visible_tasks()
         
         # Filter by completion status if requested
         completed = self.request.query_params.get('completed')
         if completed in ['true', 'false']:
             queryset = queryset.filter(completed=(completed == 'true'))
         
-        # Optimize queries for nested relationships
-        queryset = queryset.prefetch_related(
-            'subtasks',
-            'subtasks__subtasks',
-            'subtasks__subtasks__subtasks'  # 3 levels deep by default
-        )
-        
+        # Serializers read dependencies from the prefetch cache
+        if self.wants_dependencies(self.get_serializer_context()):
+            queryset = queryset.prefetch_related('task_dependencies')
         return queryset
 
     def list(self, request, *args, **kwargs):
         """
-        Override default list to show all tasks with their complete hierarchies
+        Override default list to show root tasks with their complete hierarchies,
+        one cursor page of roots at a time (newest first).
+        The page's subtrees are fetched in one closure-table query and linked in
+        memory, so the query count does not grow with tree depth, width or page.
+        ?depth= bounds that query to the levels that are rendered, and it is
+        skipped when nothing below the roots is (?depth=0, or ?fields= without subtasks).
         """
-        # Get all root tasks (tasks without parents)
-        root_tasks = self.get_queryset().filter(parent_task__isnull=True)
-        
-        def build_task_tree(task):
-            task_data = TaskDetailSerializer(task, context=self.get_serializer_context()).data
-            task_data['subtasks'] = [build_task_tree(subtask) for subtask in task.subtasks.all()]
-            return task_data
-        
-        task_tree = [build_task_tree(task) for task in root_tasks]
-        return Response(task_tree)
+        context = self.get_serializer_context()
+        depth = subtask_depth(context)
+
+        # Root tasks (tasks without parents), optionally filtered by completion
+        root_tasks = self.get_visible_tasks().filter(parent_task__isnull=True)
+        completed = request.query_params.get('completed')
+        if completed in ['true', 'false']:
+            root_tasks = root_tasks.filter(completed=(completed == 'true'))
+        root_tasks = self.paginate_queryset(root_tasks)
+
+        descendants, children = [], {}
+        if depth != 0:
+            descendants, children = load_subtrees(
+                self.get_visible_tasks(), [task.id for task in root_tasks], depth
+            )
+        if self.wants_dependencies(context):
+            models.prefetch_related_objects(root_tasks + descendants, 'task_dependencies')
+
+        context['task_children'] = children
+        if wants_field(context, 'can_mark_complete'):
+            get_completion_evaluator(context).prime(task.id for task in root_tasks + descendants)
+        serializer = TaskDetailSerializer(root_tasks, many=True, context=context)
+        return self.get_paginated_response(serializer.data)
     
     def check_dependencies(self, task):
         """Check if all dependencies are satisfied"""
@@ -111,20 +145,73 @@ class TaskViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def subtasks(self, request, pk=None):
-        """Get all subtasks for a specific task (all levels)"""
+        """Get all subtasks for a specific task (all levels, or ?depth= levels below the direct ones)"""
         task = self.get_object()
-        
-        def get_nested_subtasks(task):
-            subtasks = []
-            for subtask in task.subtasks.all():
-                subtask_data = TaskDetailSerializer(subtask, context={'request': request, 'hide_parent': True}).data
-                subtask_data['subtasks'] = get_nested_subtasks(subtask)
-                subtasks.append(subtask_data)
-            return subtasks
-        
-        nested_subtasks = get_nested_subtasks(task)
-        return Response(nested_subtasks)
+        context = self.get_serializer_context()
+        # The direct subtasks are always rendered, deeper levels only when nested
+        depth = subtask_depth(context)
+        descendants = self.get_visible_tasks()
+        if self.wants_dependencies(context):
+            descendants = descendants.prefetch_related('task_dependencies')
+        descendants, children = load_subtrees(
+            descendants, [task.id], None if depth is None else depth + 1
+        )
+
+        context.update({'hide_parent': True, 'task_children': children})
+        if wants_field(context, 'can_mark_complete'):
+            get_completion_evaluator(context).prime(subtask.id for subtask in descendants)
+        serializer = TaskDetailSerializer(
+            children.get(task.id, []),
+            many=True,
+            context=context
+        )
+        return Response(serializer.data)
     
+    @action(detail=False, methods=['post'], url_path='bulk-complete')
+    def bulk_complete(self, request):
+        """
+        Complete or reopen many tasks at once.
+        Body: {"ids": [1, 2, 3], "completed": true}
+        The batch is all-or-nothing: dependencies and subtasks are validated for
+        every task up front, changes are written with one bulk update and parent
+        completion is rolled up once for all affected ancestors.
+        """
+        payload = TaskBulkCompletionSerializer(data=request.data)
+        payload.is_valid(raise_exception=True)
+        task_ids = set(payload.validated_data['ids'])
+        completed = payload.validated_data['completed']
+
+        tasks = list(self.get_visible_tasks().filter(id__in=task_ids))
+        errors = {}
+        for missing_id in task_ids - {task.id for task in tasks}:
+            errors[missing_id] = "Task not found"
+        for task in tasks:
+            if task.owner_id != request.user.id:
+                errors[task.id] = "Only the task owner can change its completion"
+
+        if completed and not errors:
+            completing = {task.id for task in tasks if not task.completed}
+            allowed = evaluate_completion(completing, assume_completed=completing)
+            for task_id, can_complete in allowed.items():
+                if not can_complete:
+                    errors[task_id] = "Task has incomplete subtasks or unsatisfied dependencies"
+
+        if errors:
+            return Response(
+                {'errors': {str(task_id): message for task_id, message in sorted(errors.items())}},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        changed_ids, (rolled_up_completed, rolled_up_reopened) = set_completion(tasks, completed)
+        return Response({
+            'completed': completed,
+            'updated': sorted(changed_ids),
+            'rolled_up': {
+                'completed': sorted(rolled_up_completed),
+                'reopened': sorted(rolled_up_reopened)
+            }
+        })
+
     @action(detail=True, methods=['patch'])
     def assign_owner(self, request, pk=None):
         """Custom action to assign/reassign task owner"""
@@ -152,12 +239,31 @@ class TaskViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def timeline(self, request, pk=None):
-        """Get calculated timeline for this task"""
+        """
+        Get calculated timeline for this task: the earliest dates its
+        dependencies allow, counted from the project start date (today for
+        tasks outside a project). Owners' other work is not considered; see
+        /api/schedule/ for resource-aware dates.
+        """
         task = self.get_object()
-        dates = task.get_optimal_dates()
+        project_start = None
+        start_offset, end_offset = 0, task.duration_days
+
+        if task.project_id is not None:
+            project_start = Project.objects.filter(pk=task.project_id).values_list(
+                'start_date', flat=True
+            ).first()
+            graph = dependency_graphs.get(task.project_id)
+            if task.id in graph:
+                try:
+                    start_offset, end_offset = graph.earliest_offsets(task.id)
+                except ValueError as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        project_start = project_start or timezone.now().date()
         return Response({
-            'start_date': dates.get('start_date'),
-            'end_date': dates.get('end_date'),
+            'start_date': project_start + timedelta(days=start_offset),
+            'end_date': project_start + timedelta(days=end_offset),
             'duration': task.duration_days
         })
     
@@ -1,3 +1,618 @@
-from django.test import TestCase
+import base64
+import os
+import random
+import subprocess
+import sys
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Project, ScheduleEntry, ScheduleJob, ScheduleVersion, Task, TaskDependency
+from .services import completion
+from .services.completion import set_completion
+from .services.counters import PROJECT_COUNTERS, TASK_COUNTERS, rebuild_counters
+from .services.dependency_graph import (
+    creates_circular_dependency, dependency_graphs, dependency_path_exists
+)
+from .services.incremental_scheduling import IncrementalScheduler
+from .services.schedule_cache import _change_log, changes_between, current_version, schedule_cache
+from .services import critical_path as cpm, scheduling
+from .services.scenarios import apply_overrides, compare_scenarios
+from .services.schedule_jobs import current_worker, sweep_orphaned_jobs
+from .services.scheduling import GlobalParallelScheduler, TaskRow
+
+
+class TaskTreeQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='owner')
+        self.project = Project.objects.create(title='Project', owner=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.chain = []
+        parent = None
+        for i in range(13):
+            parent = Task.objects.create(
+                project=self.project, parent_task=parent, title=f'Task {i}', owner=self.user
+            )
+            self.chain.append(parent)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), len(queries.captured_queries)
+
+    def assert_chain(self, node, titles):
+        for title in titles:
+            self.assertEqual(node['title'], title)
+            subtasks = node.get('subtasks', [])  # left out once the depth is used up
+            self.assertLessEqual(len(subtasks), 1)
+            node = subtasks[0] if subtasks else None
+        self.assertIsNone(node)
+
+    def test_retrieve_nests_direct_children_with_constant_queries(self):
+        data, queries = self.get('/api/tasks/%d/' % self.chain[0].id)
+        self.assert_chain(data, [task.title for task in self.chain])
+        self.assertLessEqual(queries, 10)
+
+    def test_retrieve_hides_private_subtasks_of_others(self):
+        other = User.objects.create(username='other')
+        Task.objects.create(
+            project=self.project, parent_task=self.chain[0], title='Secret', owner=other, is_private=True
+        )
+        data, _ = self.get('/api/tasks/%d/' % self.chain[0].id)
+        self.assert_chain(data, [task.title for task in self.chain])
+
+    def test_project_tasks_nests_direct_children_with_constant_queries(self):
+        data, queries = self.get('/api/projects/%d/tasks/' % self.project.id)
+        self.assertEqual(len(data['tasks']), 1)
+        self.assert_chain(data['tasks'][0], [task.title for task in self.chain])
+        self.assertLessEqual(queries, 12)
+
+    def test_project_detail_nests_subtasks_with_constant_queries(self):
+        data, queries = self.get('/api/projects/%d/?depth=20' % self.project.id)
+        self.assert_chain(data['tasks'][0], [task.title for task in self.chain])
+        self.assertLessEqual(queries, 10)
+
+    def test_project_detail_hides_private_subtasks_of_others(self):
+        other = User.objects.create(username='other')
+        Task.objects.create(
+            project=self.project, parent_task=self.chain[0], title='Secret', owner=other, is_private=True
+        )
+        data, _ = self.get('/api/projects/%d/?depth=3' % self.project.id)
+        self.assert_chain(data['tasks'][0], ['Task 0', 'Task 1', 'Task 2'])
+
+    def test_project_detail_without_subtasks_skips_the_closure_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/projects/%d/?depth=3&fields=tasks.title' % self.project.id)
+        self.assertEqual(response.json(), {'tasks': [{'title': 'Task 0'}]})
+        self.assertFalse(any('base_taskclosure' in query['sql'] for query in queries.captured_queries))
+
+    def test_list_without_subtasks_skips_the_closure_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tasks/?fields=id,title')
+        self.assertEqual(response.json()['results'], [{'id': self.chain[0].id, 'title': 'Task 0'}])
+        self.assertFalse(any('base_taskclosure' in query['sql'] for query in queries.captured_queries))
+
+    def test_depth_bounds_the_loaded_levels(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/tasks/?depth=2&fields=id,title,subtasks')
+        self.assert_chain(response.json()['results'][0], ['Task 0', 'Task 1', 'Task 2'])
+        loaded = [query['sql'] for query in queries.captured_queries if 'base_taskclosure' in query['sql']]
+        self.assertEqual(len(loaded), 1)
+
+        data, _ = self.get('/api/tasks/%d/subtasks/?depth=1&fields=id,title,subtasks' % self.chain[0].id)
+        self.assertEqual(len(data), 1)
+        self.assert_chain(data[0], ['Task 1', 'Task 2'])
+
+
+class BulkCompleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        project = Project.objects.create(title='Project', owner=self.user)
+        self.grandparent = Task.objects.create(project=project, title='Grandparent', owner=self.user)
+        self.parent = Task.objects.create(
+            project=project, parent_task=self.grandparent, title='Parent', owner=self.user
+        )
+        self.subtasks = [
+            Task.objects.create(project=project, parent_task=self.parent, title=f'Sub {i}', owner=self.user)
+            for i in range(2)
+        ]
+
+    def post(self, tasks):
+        return self.client.post(
+            '/api/tasks/bulk-complete/', {'ids': [task.id for task in tasks], 'completed': True}, format='json'
+        )
+
+    def test_parent_completes_with_its_subtasks_in_one_rollup(self):
+        with mock.patch.object(completion, 'rollup_completion', wraps=completion.rollup_completion) as rollup:
+            response = self.post([self.parent] + self.subtasks)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['updated'], sorted(task.id for task in [self.parent] + self.subtasks))
+        self.assertEqual(response.json()['rolled_up'], {'completed': [self.grandparent.id], 'reopened': []})
+        self.assertEqual(rollup.call_count, 1)
+        self.assertTrue(Task.objects.get(pk=self.grandparent.pk).completed)
+
+    def test_batch_is_all_or_nothing(self):
+        response = self.post([self.parent, self.subtasks[0]])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), [str(self.parent.id)])
+        self.assertFalse(Task.objects.filter(completed=True).exists())
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='owner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        project = Project.objects.create(title='Project', owner=self.user)
+        tasks = [Task.objects.create(project=project, title=f'Task {i}', owner=self.user) for i in range(8)]
+        # Most rows share one created_at, so only the id tells them apart
+        tied = timezone.now()
+        Task.objects.filter(pk__in=[task.pk for task in tasks[1:7]]).update(created_at=tied)
+        self.expected = list(
+            Task.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def walk(self, url, direction):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append([task['id'] for task in response.json()['results']])
+            url = response.json()[direction]
+        return pages
+
+    def test_pages_forwards_and_back_over_tied_timestamps(self):
+        forward = self.walk('/api/tasks/?fields=id&page_size=3', 'next')
+        self.assertEqual([len(page) for page in forward], [3, 3, 2])
+        self.assertEqual(sum(forward, []), self.expected)
+
+        last = self.client.get('/api/tasks/?fields=id&page_size=3').json()
+        while last['next']:
+            last = self.client.get(last['next']).json()
+        backward = self.walk(last['previous'], 'previous')
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_invalid_cursors_are_not_found(self):
+        bad_json = base64.urlsafe_b64encode(b'{"r": 0').decode()
+        missing_key = base64.urlsafe_b64encode(b'{"r": 0, "i": 1}').decode()
+        bad_time = base64.urlsafe_b64encode(b'{"r": 0, "t": "soon", "i": 1}').decode()
+        for cursor in ('not-base64!', bad_json, missing_key, bad_time):
+            response = self.client.get('/api/tasks/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_project_list_has_no_count(self):
+        data = self.client.get('/api/projects/').json()
+        self.assertEqual(set(data), {'next', 'previous', 'results'})
+
+
+class CircularDependencyTests(TestCase):
+    def test_check_ignores_stale_cached_graph(self):
+        user = User.objects.create(username='owner')
+        project = Project.objects.create(title='Project', owner=user)
+        a = Task.objects.create(project=project, title='A', owner=user)
+        b = Task.objects.create(project=project, title='B', owner=user)
+        dependency_graphs.clear()
+        self.assertEqual(len(dependency_graphs.get(project.id)), 2)
+
+        # Written by another process: no signal reaches this process's cache
+        TaskDependency.objects.bulk_create([TaskDependency(task=b, depends_on=a)])
+
+        self.assertTrue(creates_circular_dependency(a, b))
+        self.assertFalse(creates_circular_dependency(b, a))
+
+
+class DependencyGraphCacheTests(TestCase):
+    def setUp(self):
+        self.project = Project.objects.create(title='Project')
+        self.a = Task.objects.create(project=self.project, title='A')
+        self.b = Task.objects.create(project=self.project, title='B')
+        dependency_graphs.clear()
+
+    def write_edge_elsewhere(self):
+        # Another worker's write: its signals never reach this process's cache
+        TaskDependency.objects.bulk_create([TaskDependency(task=self.b, depends_on=self.a)])
+        ScheduleVersion.objects.update(data_version=F('data_version') + 1)
+
+    def test_snapshot_is_reused_until_the_data_version_moves(self):
+        graph = dependency_graphs.get(self.project.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIs(dependency_graphs.get(self.project.id), graph)
+        self.assertEqual(len(queries.captured_queries), 1)
+
+        self.write_edge_elsewhere()
+        graph = dependency_graphs.get(self.project.id)
+        self.assertEqual(graph.prerequisites(self.b.id), [self.a.id])
+
+    def test_timeline_follows_another_workers_edge(self):
+        Project.objects.filter(pk=self.project.pk).update(start_date=date(2025, 1, 1))
+        Task.objects.filter(pk=self.a.pk).update(duration_days=3)
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='owner'))
+        url = '/api/tasks/%d/timeline/' % self.b.id
+        self.assertEqual(client.get(url).json()['start_date'], '2025-01-01')
+
+        self.write_edge_elsewhere()
+        self.assertEqual(client.get(url).json()['start_date'], '2025-01-04')
+
+    def test_validation_reads_current_rows(self):
+        user = User.objects.create(username='owner')
+        client = APIClient()
+        client.force_authenticate(user)
+        url = '/api/projects/%d/validate-dependencies/' % self.project.id
+        self.assertTrue(client.get(url).json()['valid'])
+
+        # Unlike the cache, validation does not depend on the version being bumped
+        TaskDependency.objects.bulk_create([
+            TaskDependency(task=self.b, depends_on=self.a),
+            TaskDependency(task=self.a, depends_on=self.b),
+        ])
+        data = client.get(url).json()
+        self.assertFalse(data['valid'])
+        self.assertEqual(data['dependency_count'], 2)
+        self.assertEqual(data['cycles'], [[self.a.id, self.b.id]])
+
+
+@override_settings(SCHEDULE_STALE_WHILE_REVALIDATE=False)
+class ScheduleVersionTests(TestCase):
+    def setUp(self):
+        # Versions logged by earlier tests were rolled back and will be reused
+        _change_log.clear()
+        schedule_cache.clear()
+        self.user = User.objects.create(username='owner')
+        self.project = Project.objects.create(title='Project', owner=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_writes_bump_the_shared_version(self):
+        version = current_version()
+        Task.objects.create(project=self.project, title='A', owner=self.user)
+        self.assertGreater(ScheduleVersion.objects.get().data_version, version)
+
+    def test_cascading_delete_takes_one_version(self):
+        tasks = [Task.objects.create(project=self.project, title='Root')]
+        for i in range(4):
+            tasks.append(Task.objects.create(project=self.project, parent_task=tasks[i // 2], title=f'T{i}'))
+        TaskDependency.objects.create(task=tasks[3], depends_on=tasks[1])
+        task_ids = {task.id for task in tasks}
+        version = current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks[0].delete()
+        self.assertEqual(current_version(), version + 1)
+        self.assertEqual(changes_between(version, version + 1), task_ids)
+
+    def test_version_bumped_by_another_process_is_seen(self):
+        Task.objects.create(project=self.project, title='A', owner=self.user)
+        first = self.client.get('/api/schedule/')
+        self.assertEqual(len(first.json()['schedule']), 1)
+
+        # Another worker's write: this process's signals never ran for it
+        Task.objects.bulk_create([Task(project=self.project, title='B', owner=self.user)])
+        ScheduleVersion.objects.update(data_version=F('data_version') + 1)
+
+        second = self.client.get('/api/schedule/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()['schedule']), 2)
+        self.assertEqual(ScheduleEntry.objects.count(), 2)
+        self.assertEqual(ScheduleVersion.objects.get().stored_version, current_version())
+
+    def test_cold_stream_fills_the_cache(self):
+        Task.objects.create(project=self.project, title='A', owner=self.user)
+        version = current_version()
+        response = self.client.get('/api/schedule/?stream=ndjson')
+        self.assertEqual(response['ETag'], f'"schedule-{version}"')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIsNotNone(schedule_cache.peek(version))
+
+        again = self.client.get('/api/schedule/?stream=ndjson', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+
+@override_settings(SCHEDULER_MAX_WORKERS=2, SCHEDULER_PARALLEL_MIN_TASKS=0)
+class SchedulerPoolTests(TestCase):
+    def setUp(self):
+        for i in range(2):
+            owner = User.objects.create(username=f'user{i}')
+            project = Project.objects.create(title=f'Project {i}', start_date=date(2025, 1, 1))
+            Task.objects.create(project=project, title=f'Task {i}', owner=owner)
+
+    def test_broken_pool_is_replaced(self):
+        pool = scheduling.get_worker_pool(2)
+        with override_settings(SCHEDULER_MAX_WORKERS=1):
+            expected = GlobalParallelScheduler().generate_schedule()
+        with mock.patch.object(pool, 'submit', side_effect=BrokenProcessPool):
+            self.assertEqual(GlobalParallelScheduler().generate_schedule(), expected)
+        self.assertIsNot(scheduling.get_worker_pool(2), pool)
+
+
+class ScenarioTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        self.p = Project.objects.create(title='P', start_date=date(2025, 1, 1))
+        self.q = Project.objects.create(title='Q', start_date=date(2025, 1, 1))
+        self.a = Task.objects.create(project=self.p, title='A', owner=self.alice, duration_days=2)
+        self.b = Task.objects.create(project=self.p, title='B', owner=self.alice, duration_days=3)
+        self.c = Task.objects.create(project=self.p, title='C', owner=self.bob, duration_days=1)
+        self.d = Task.objects.create(project=self.q, title='D', owner=self.bob, duration_days=4)
+        TaskDependency.objects.create(task=self.c, depends_on=self.a)
+
+    def test_apply_overrides_copies_only_touched_projects(self):
+        snapshot = GlobalParallelScheduler()._load_snapshot()
+        changed = apply_overrides(snapshot, {
+            'owner_changes': [{'task': self.b.id, 'owner': self.bob.id}],
+            'duration_changes': [{'task': self.a.id, 'duration_days': 5}],
+            'remove_dependencies': [{'task': self.c.id, 'depends_on': self.a.id}],
+            'add_dependencies': [{'task': self.b.id, 'depends_on': self.c.id}],
+        }, {self.bob.id: 'bob'})
+
+        rows = {task.id: task for task in changed.tasks[self.p.id]}
+        self.assertEqual((rows[self.b.id].owner_id, rows[self.b.id].assignee), (self.bob.id, 'bob'))
+        self.assertEqual(rows[self.a.id].duration_days, 5)
+        self.assertEqual(changed.edges[self.p.id], [(self.b.id, self.c.id)])
+        self.assertIs(changed.tasks[self.q.id], snapshot.tasks[self.q.id])
+        self.assertEqual(snapshot.edges[self.p.id], [(self.c.id, self.a.id)])
+        self.assertEqual({task.id: task.duration_days for task in snapshot.tasks[self.p.id]}[self.a.id], 2)
+
+    def test_deltas_against_the_baseline(self):
+        result = compare_scenarios(
+            [{'name': 'Longer D', 'duration_changes': [{'task': self.d.id, 'duration_days': 9}]}], {}
+        )
+        outcome = result['scenarios'][0]
+        self.assertEqual(outcome['name'], 'Longer D')
+        self.assertEqual(outcome['makespan_delta_days'], 5)
+        self.assertEqual(outcome['makespan_days'], result['baseline']['makespan_days'] + 5)
+        deltas = {row['project_id']: row['delta_days'] for row in outcome['projects']}
+        self.assertEqual(deltas, {self.p.id: 0, self.q.id: 5})
+
+    def test_worker_pool_matches_in_process_evaluation(self):
+        scenarios = [
+            {'duration_changes': [{'task': self.d.id, 'duration_days': days}]} for days in (1, 6, 9)
+        ] + [{'owner_changes': [{'task': self.c.id, 'owner': self.alice.id}]}]
+        usernames = {self.alice.id: 'alice'}
+        with override_settings(SCHEDULER_MAX_WORKERS=1):
+            expected = compare_scenarios(scenarios, usernames)
+        with override_settings(SCHEDULER_MAX_WORKERS=2):
+            self.assertEqual(compare_scenarios(scenarios, usernames), expected)
+
+
+class CriticalPathTests(SimpleTestCase):
+    def rows(self, durations):
+        return {task_id: TaskRow(task_id, '', None, None, days) for task_id, days in durations.items()}
+
+    def test_small_graph(self):
+        # 1 -> 2 -> 4 and 1 -> 3 -> 4; 5 stands alone
+        task_map = self.rows({1: 3, 2: 2, 3: 4, 4: 1, 5: 2})
+        result = cpm.critical_path({1: [2, 3], 2: [4], 3: [4]}, task_map)
+        self.assertEqual(result.earliest_start, [0, 3, 3, 7, 0])
+        self.assertEqual(result.latest_finish, [3, 7, 7, 8, 8])
+        self.assertEqual(result.slack, [0, 2, 0, 0, 6])
+        self.assertEqual(result.chain, [1, 3, 4])
+        self.assertEqual(result.duration, 8)
+
+    def test_cycles_are_reported(self):
+        with self.assertRaisesMessage(ValueError, 'Circular dependencies detected between tasks: 1, 2'):
+            cpm.critical_path({1: [2], 2: [1]}, self.rows({1: 1, 2: 1, 3: 1}))
+
+    @skipIf(cpm.np is None, 'NumPy is not installed')
+    def test_numpy_and_pure_python_passes_agree(self):
+        rnd = random.Random(15)
+        for _ in range(20):
+            size = rnd.randint(1, 60)
+            task_map = self.rows({task_id: rnd.randint(1, 9) for task_id in range(1, size + 1)})
+            graph = {}
+            for _ in range(rnd.randint(0, size * 2)):
+                first, second = sorted(rnd.sample(range(1, size + 1), 2)) if size > 1 else (1, 1)
+                if first != second:
+                    graph.setdefault(first, []).append(second)
+
+            with_numpy = cpm.critical_path(graph, task_map)
+            with mock.patch.object(cpm, 'np', None):
+                without_numpy = cpm.critical_path(graph, task_map)
+            self.assertEqual(with_numpy, without_numpy)
+
+
+@skipIf(os.name != 'posix', 'Process liveness is only probed on POSIX')
+class OrphanedJobTests(TestCase):
+    def test_sweep_fails_only_jobs_of_dead_processes(self):
+        finished = subprocess.Popen([sys.executable, '-c', ''])
+        finished.wait()
+        host = current_worker().rpartition(':')[0]
+        jobs = {
+            name: ScheduleJob.objects.create(status=status, worker=worker)
+            for name, status, worker in [
+                ('dead', 'running', f'{host}:{finished.pid}'),
+                ('unrecorded', 'pending', ''),
+                ('own', 'running', current_worker()),
+                ('other host', 'pending', f'elsewhere.{host}:{finished.pid}'),
+                ('done', 'succeeded', f'{host}:{finished.pid}'),
+            ]
+        }
+        self.assertEqual(sweep_orphaned_jobs(force=True), 2)
+        statuses = {name: ScheduleJob.objects.get(pk=job.pk).status for name, job in jobs.items()}
+        self.assertEqual(statuses, {
+            'dead': 'failed', 'unrecorded': 'failed', 'own': 'running',
+            'other host': 'pending', 'done': 'succeeded',
+        })
+
+
+class IncrementalScheduleTests(TestCase):
+    def setUp(self):
+        self.rnd = random.Random(14)
+        self.users = [User.objects.create(username=f'user{i}') for i in range(4)] + [None]
+        self.projects = []
+        for p in range(3):
+            project = Project.objects.create(title=f'Project {p}', start_date=date(2025, 1, 1 + p))
+            tasks = [
+                Task.objects.create(
+                    project=project, title=f'Task {i}', owner=self.rnd.choice(self.users),
+                    duration_days=self.rnd.randint(1, 10)
+                )
+                for i in range(15)
+            ]
+            for _ in range(12):
+                a, b = sorted(self.rnd.sample(range(len(tasks)), 2))
+                TaskDependency.objects.get_or_create(task=tasks[b], depends_on=tasks[a])
+            self.projects.append(project)
+
+    def edit(self):
+        """Apply one random edit and return the ids of the tasks it touched"""
+        tasks = list(Task.objects.all())
+        task = self.rnd.choice(tasks)
+        op = self.rnd.choice(['duration', 'owner', 'title', 'add', 'remove', 'create', 'delete', 'move'])
+        if op == 'duration':
+            task.duration_days = self.rnd.randint(1, 10)
+        elif op == 'owner':
+            task.owner = self.rnd.choice(self.users)
+        elif op == 'title':
+            task.title = 'Renamed'
+        elif op == 'move':
+            task.project = self.rnd.choice(self.projects)
+        if op in ('duration', 'owner', 'title', 'move'):
+            task.save()
+            return {task.id}
+        if op == 'add':
+            other = self.rnd.choice([t for t in tasks if t.project_id == task.project_id and t != task])
+            if not dependency_path_exists(other.id, task.id):
+                TaskDependency.objects.get_or_create(task=task, depends_on=other)
+            return {task.id}
+        if op == 'remove':
+            dependency = TaskDependency.objects.order_by('?').first()
+            dependency.delete()
+            return {dependency.task_id}
+        if op == 'create':
+            return {Task.objects.create(
+                project=task.project, owner=self.rnd.choice(self.users), duration_days=3
+            ).id}
+        touched = {task.id} | set(TaskDependency.objects.filter(depends_on=task).values_list('task_id', flat=True))
+        task.delete()
+        return touched
+
+    def test_repair_matches_full_run(self):
+        scheduler = IncrementalScheduler()
+        scheduler.generate_schedule()
+        repaired = 0
+        for _ in range(60):
+            result = scheduler.reschedule(self.edit())
+            if result is None:
+                result = scheduler.generate_schedule()
+            else:
+                repaired += 1
+            self.assertEqual(result, GlobalParallelScheduler().generate_schedule())
+        self.assertGreater(repaired, 30)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='owner')
+        self.project = Project.objects.create(title='Project', owner=self.user)
+        self.parent = Task.objects.create(project=self.project, title='Parent', owner=self.user)
+        self.child = Task.objects.create(
+            project=self.project, parent_task=self.parent, title='Child', owner=self.user
+        )
+
+    def assert_counters_rebuildable(self):
+        """Incrementally maintained counters equal a recount from scratch"""
+        counters = (
+            list(Task.objects.order_by('pk').values_list('pk', *TASK_COUNTERS)),
+            list(Project.objects.order_by('pk').values_list('pk', *PROJECT_COUNTERS)),
+        )
+        rebuild_counters()
+        self.assertEqual(counters, (
+            list(Task.objects.order_by('pk').values_list('pk', *TASK_COUNTERS)),
+            list(Project.objects.order_by('pk').values_list('pk', *PROJECT_COUNTERS)),
+        ))
+
+    def test_stale_instance_save_keeps_counters_in_step(self):
+        a = Task.objects.get(pk=self.child.pk)
+        b = Task.objects.get(pk=self.child.pk)
+        a.completed = True
+        a.save()
+        self.parent.refresh_from_db()
+        self.assertEqual(self.parent.completed_descendant_count, 1)
+
+        # b still holds completed=False and writes it back
+        b.title = 'Renamed'
+        b.save()
+        self.assertFalse(Task.objects.get(pk=self.child.pk).completed)
+        self.parent.refresh_from_db()
+        self.assertEqual(self.parent.completed_descendant_count, 0)
+        self.assert_counters_rebuildable()
+
+    def test_stale_instances_in_bulk_completion(self):
+        stale = Task.objects.get(pk=self.child.pk)
+        fresh = Task.objects.get(pk=self.child.pk)
+        fresh.completed = True
+        fresh.save()
+
+        # stale still says completed=False: completing it again must not count twice
+        changed, _ = set_completion([stale], True)
+        self.assertEqual(changed, set())
+        self.assert_counters_rebuildable()
+
+    def test_stale_instance_move_relinks_closure(self):
+        other = Task.objects.create(project=self.project, title='Other', owner=self.user)
+        a = Task.objects.get(pk=self.child.pk)
+        b = Task.objects.get(pk=self.child.pk)
+        a.parent_task = other
+        a.save()
+
+        # b still holds the old parent and moves the task back
+        b.save()
+        self.assertEqual(
+            list(Task.objects.get(pk=self.child.pk).get_ancestors().values_list('pk', flat=True)),
+            [self.parent.pk]
+        )
+        self.parent.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.parent.descendant_count, other.descendant_count), (1, 0))
+        self.assert_counters_rebuildable()
+
+    def make_subtree(self, parent, size, owner=None, fanout=2):
+        tasks = []
+        for i in range(size):
+            tasks.append(Task.objects.create(
+                project=self.project, parent_task=(tasks[(i - 1) // fanout] if i else parent),
+                title=f'Node {i}', owner=owner or self.user, completed=i % 3 == 0
+            ))
+        return tasks
+
+    def test_subtree_delete_costs_constant_queries(self):
+        # Three levels each: the collector itself still queries once per level
+        costs = []
+        for size, fanout in ((5, 2), (21, 4)):
+            root = self.make_subtree(self.parent, size, fanout=fanout)[0]
+            with CaptureQueriesContext(connection) as queries:
+                root.delete()
+            costs.append(len(queries.captured_queries))
+            self.assert_counters_rebuildable()
+        self.assertEqual(costs[0], costs[1])
+
+    def test_cascading_deletes_keep_counters_in_step(self):
+        other_user = User.objects.create(username='other')
+        nested = self.make_subtree(self.parent, 6)
+        self.make_subtree(self.parent, 4, owner=other_user)
+
+        Task.objects.filter(pk__in=[nested[0].pk, nested[2].pk, nested[5].pk]).delete()
+        self.assert_counters_rebuildable()
+
+        other_user.delete()
+        self.assert_counters_rebuildable()
+
+        other_project = Project.objects.create(title='Other', owner=self.user)
+        Task.objects.create(project=other_project, title='Elsewhere', owner=self.user)
+        self.project.delete()
+        self.assert_counters_rebuildable()
+        self.assertEqual(Project.objects.get(pk=other_project.pk).task_count, 1)
@@ -5,7 +5,15 @@ from base.auth.api_views import CustomObtainAuthToken
 from base.auth.views import APILogoutView, CustomLoginView, LogoutView, ProfileView, UserRegistrationView
 from base.dependencies.views import TaskDependencyViewSet
 from base.projects.views import ProjectViewSet
-from base.scheduling.views import global_schedule
+from base.scheduling.views import (
+    create_schedule_job,
+    global_schedule,
+    project_critical_path,
+    project_schedule,
+    schedule_job_detail,
+    schedule_scenarios,
+    user_schedule,
+)
 from base.tasks.views import TaskViewSet
 from base.users.views import UserViewSet
 
@@ -26,6 +34,12 @@ urlpatterns = [
     # API endpoints
     path('api/', include(router.urls)),
     path('api/schedule/', global_schedule, name='global-schedule'),
+    path('api/schedule/jobs/', create_schedule_job, name='schedule-job-create'),
+    path('api/schedule/jobs/<uuid:job_id>/', schedule_job_detail, name='schedule-job-detail'),
+    path('api/schedule/scenarios/', schedule_scenarios, name='schedule-scenarios'),
+    path('api/schedule/projects/<int:project_id>/', project_schedule, name='project-schedule'),
+    path('api/schedule/users/<int:user_id>/', user_schedule, name='user-schedule'),
+    path('api/schedule/projects/<int:project_id>/critical-path/', project_critical_path, name='project-critical-path'),
     path('api/logout/', APILogoutView.as_view(), name='api-logout'),
     path('api/register/', UserRegistrationView.as_view(), name='register'),
 
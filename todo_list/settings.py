@@ -138,3 +138,21 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Dependency graph cache
+# Maximum number of project dependency graphs kept in memory per process
+DEPENDENCY_GRAPH_CACHE_SIZE = 512
+
+# Schedule cache
+# Serve the previous schedule while a newer data version is computed in the background
+SCHEDULE_STALE_WHILE_REVALIDATE = True
+
+# Scheduler
+# Worker processes for placing projects that share no owners (None: one per CPU, 1: off)
+SCHEDULER_MAX_WORKERS = None
+# Smallest total task count worth handing to worker processes
+SCHEDULER_PARALLEL_MIN_TASKS = 2000
+
+# Schedule jobs
+# Background schedule jobs run at the same time per process; the rest wait as 'pending'
+SCHEDULE_JOB_WORKERS = 2